@@ -0,0 +1,379 @@
+"""
+Offline benchmark for every pipeline stage.
+
+    python bench/run_bench.py                  # mongomock if installed, else local MongoDB
+    python bench/run_bench.py --topics 5000 --repeat 5 --llm-latency 200
+
+No network: RSS, trends24 and LLM answers come from bench/fixtures.
+Each run is appended to bench/results.jsonl (with the git commit) and
+compared against the previous run with the same settings.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+import resource
+import statistics
+import subprocess
+import contextlib
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES = os.path.join(BENCH_DIR, "fixtures")
+RESULTS_FILE = os.path.join(BENCH_DIR, "results.jsonl")
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# Never touch the real cache or the real database from a benchmark
+os.environ["LLM_CACHE_DISABLED"] = "1"
+BENCH_MONGO_URI = os.getenv("BENCH_MONGO_URI", "mongodb://localhost:27017")
+BENCH_DB_NAME = "autox_india_bench"
+
+# ==========================================
+# 🧰 FIXTURES & FAKES
+# ==========================================
+
+def load_fixture(name, mode="r"):
+    with open(os.path.join(FIXTURES, name), mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+        return f.read()
+
+LLM = json.loads(load_fixture("llm_responses.json"))
+
+def simulated_latency(ms):
+    if ms:
+        time.sleep(random.uniform(0.5, 1.5) * ms / 1000.0)
+
+class FakeGemini:
+    """Stands in for gemini_client.GeminiResolver with recorded answers."""
+    models = ["bench-gemini"]
+
+    def __init__(self, latency_ms):
+        self.latency_ms = latency_ms
+
+    def generate(self, prompt, generation_config=None):
+        simulated_latency(self.latency_ms)
+        if prompt.startswith(("Refine these", "Repair these")):
+            return json.dumps(LLM["gemini_refine"], ensure_ascii=False)
+        if "For EACH tweet" in prompt:
+            count = prompt.count('"index":')
+            return json.dumps({"comments": [{"index": i, "comment": LLM["quote_comment"]} for i in range(count)]})
+        return LLM["quote_comment"]
+
+    def stats(self):
+        return {}
+
+# mongomock is not thread-safe: its writes mutate stored documents in place while other
+# threads filter or copy them. A server applies each operation atomically, so the bench
+# runs every mongomock operation under one lock (claims stay exclusive, iteration stays safe).
+MONGOMOCK_LOCKED = ("_iter_documents", "_copy_only_fields", "_insert", "_update", "_find_and_modify", "_delete", "bulk_write")
+
+def serialize_mongomock(mongomock):
+    import threading
+    import functools
+    lock = threading.RLock()
+
+    def locked(method, materialize=False):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            with lock:
+                result = method(*args, **kwargs)
+                return list(result) if materialize else result
+        return wrapper
+
+    for name in MONGOMOCK_LOCKED:
+        method = getattr(mongomock.collection.Collection, name)
+        if not getattr(method, "bench_locked", False):
+            # _iter_documents returns a lazy generator: filter inside the lock
+            wrapper = locked(method, materialize=name == "_iter_documents")
+            wrapper.bench_locked = True
+            setattr(mongomock.collection.Collection, name, wrapper)
+
+def connect(use_mongomock):
+    if use_mongomock:
+        import mongomock
+        serialize_mongomock(mongomock)
+        return mongomock.MongoClient(), "mongomock"
+    from pymongo import MongoClient
+    return MongoClient(BENCH_MONGO_URI, serverSelectionTimeoutMS=3000), BENCH_MONGO_URI
+
+def install_fakes(client, feeds, llm_latency_ms):
+    """Points every module at the bench database and the offline fixtures."""
+    import db as db_module
+    db_module._STATE["client"] = client
+    db_module.DB_NAME = BENCH_DB_NAME
+
+    import feedparser
+    import sentinel
+    rss = load_fixture("rss_politics.xml", "rb")
+    trends_html = load_fixture("trends24.html")
+    sentinel.RSS_FEEDS = [f"bench://feed/{i}" for i in range(feeds)]
+    sentinel.fetch_feed = lambda url, cached: (feedparser.parse(rss), {"etag": None, "modified": None})
+    sentinel.fetch_trends_html = lambda: trends_html
+    sentinel.TRENDS_USE_BROWSER = False
+
+    import generator
+    generator.OLLAMA.model = "bench-ollama"
+
+    def fake_draft(prompt, stop_when=None, options=None, **extra):
+        simulated_latency(llm_latency_ms)
+        return LLM["ollama_draft"]
+    generator.OLLAMA.generate_until = fake_draft
+
+    def fake_generate(prompt, options=None, **extra):
+        # Non-streamed calls are batches or structured (JSON) drafts
+        simulated_latency(llm_latency_ms)
+        if "for EACH topic" not in prompt:
+            return json.dumps(LLM["gemini_refine"], ensure_ascii=False)
+        count = prompt.count('"id":') - 1
+        if '"tweet_variants"' in prompt:
+            item = {"tweet_variants": LLM["gemini_refine"]["tweet_variants"]}
+        else:
+            item = {"tweets": [line.split(". ", 1)[1] for line in LLM["ollama_draft"].splitlines()]}
+        return json.dumps({"drafts": [dict(item, id=i) for i in range(count)]}, ensure_ascii=False)
+    generator.OLLAMA.generate = fake_generate
+
+    import gemini_client
+    gemini_client._RESOLVER["instance"] = FakeGemini(llm_latency_ms)
+
+# ==========================================
+# 🏗️ SEEDING
+# ==========================================
+
+WORDS = (
+    "modi bjp congress parliament election government cabinet ram mandir diwali temple ayodhya "
+    "pakistan china usa ukraine israel russia rescue relief crisis india delhi mumbai budget "
+    "reform farmers border talks summit minister court verdict rally protest festival trailer"
+).split()
+
+def seed_raw_topics(db, count):
+    today = datetime.date.today().isoformat()
+    rng = random.Random(42)
+    # Distinct stamps, all well before the watermark overlap: only docs touched later count as new
+    oldest = datetime.datetime.now() - datetime.timedelta(hours=2)
+    docs = []
+    for i in range(count):
+        trending = rng.random() < 0.1
+        docs.append({
+            "title": " ".join(rng.choice(WORDS) for _ in range(6)) + f" #{i}",
+            "category": rng.choice(["Indian Politics", "Hindu / Culture", "Global / India", "General News"]),
+            "source": "Bench",
+            "source_link": f"https://example.com/{i}",
+            "x_trending": trending,
+            "trend_rank": rng.randint(1, 10) if trending else 0,
+            "collected_at": today,
+            "updated_at": oldest + datetime.timedelta(milliseconds=i)
+        })
+    db.raw_topics.delete_many({})
+    if docs:
+        db.raw_topics.insert_many(docs)
+
+def seed_approved_topics(db, count):
+    today = datetime.date.today().isoformat()
+    db.top_topics.delete_many({})
+    db.final_tweets.delete_many({})
+    db.top_topics.insert_many([{
+        "title": f"Bench topic {i}: Modi inaugurates Ram Mandir",
+        "category": "Hindu / Culture / Indian Politics",
+        "source_link": f"https://example.com/{i}",
+        "score": 40,
+        "date": today,
+        "status": "approved_for_ai",
+        "created_at": datetime.datetime.now()
+    } for i in range(count)])
+
+def seed_final_tweets(db, count, enhanced=False):
+    db.final_tweets.delete_many({})
+    db.final_tweets.insert_many([{
+        "topic": f"Bench topic {i}",
+        "source": f"https://example.com/{i}",
+        "tweet_variants": [dict(v) for v in LLM["gemini_refine"]["tweet_variants"]],
+        "status": "ready_for_posting",
+        "enhanced": enhanced,
+        "generated_at": datetime.datetime.now()
+    } for i in range(count)])
+
+# ==========================================
+# 🏁 STAGES: (setup(db) -> items, run(db))
+# ==========================================
+
+def bench_stages(args):
+    import sentinel
+    import processor
+    import generator
+    import enhancer
+    import dedupe
+
+    def sentinel_setup(db):
+        db.raw_topics.delete_many({})
+        db.feed_state.delete_many({})
+        dedupe._INDEX["instance"] = None
+        return args.feeds * sentinel.RSS_ENTRIES_PER_FEED + sentinel.TRENDS_LIMIT
+
+    def sentinel_run(db):
+        # A swallowed per-feed error would leave nothing to measure
+        failed = sentinel.fetch_news_topics(db.raw_topics)
+        if failed:
+            raise RuntimeError(f"{len(failed)}/{args.feeds} bench feeds failed, see --verbose")
+        sentinel.fetch_x_trends(db.raw_topics)
+
+    def processor_setup(db):
+        seed_raw_topics(db, args.topics)
+        for name in ("top_topics", "topic_scores", "processor_state"):
+            db[name].delete_many({})
+        return args.topics
+
+    def processor_incremental_setup(db):
+        # Full run first, then 1% of the day's topics change before the timed run
+        processor_setup(db)
+        with open(os.devnull, "w") as out, contextlib.redirect_stdout(out):
+            processor.process_topics(db)
+        changed = max(1, args.topics // 100)
+        ids = [d["_id"] for d in db.raw_topics.find({}, {"_id": 1}).limit(changed)]
+        db.raw_topics.update_many({"_id": {"$in": ids}}, {"$set": {"x_trending": True, "trend_rank": 1, "updated_at": datetime.datetime.now()}})
+        return changed
+
+    def generator_setup(db):
+        seed_approved_topics(db, args.generate)
+        return args.generate
+
+    def enhancer_setup(db):
+        seed_final_tweets(db, args.generate)
+        return args.generate
+
+    def dashboard_setup(db):
+        seed_final_tweets(db, args.tweets, enhanced=True)
+        return min(args.tweets, 50)
+
+    def dashboard_run(db):
+        import dashboard
+        tweets, _ = dashboard.fetch_page(50, None)
+        dashboard.dump_json(tweets)
+
+    return {
+        "sentinel": (sentinel_setup, sentinel_run),
+        "processor": (processor_setup, processor.process_topics),
+        "processor_incr": (processor_incremental_setup, processor.process_topics),
+        "generator": (generator_setup, generator.generate_engine),
+        "enhancer": (enhancer_setup, enhancer.run_enhancer),
+        "dashboard_api": (dashboard_setup, dashboard_run)
+    }
+
+def peak_rss_mb():
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[idx]
+
+def run_stage(db, setup, run, repeat, quiet):
+    """A stage whose run returns a count (the processor) reports the items it actually handled."""
+    latencies = []
+    items = 0
+    for _ in range(repeat):
+        items = setup(db)
+        out = open(os.devnull, "w") if quiet else None
+        with (contextlib.redirect_stdout(out) if quiet else contextlib.nullcontext()):
+            start = time.perf_counter()
+            handled = run(db)
+            latencies.append(time.perf_counter() - start)
+        if isinstance(handled, int):
+            items = handled
+        if out:
+            out.close()
+
+    p50 = statistics.median(latencies)
+    return {
+        "items": items,
+        "p50_s": round(p50, 4),
+        "p95_s": round(percentile(latencies, 95), 4),
+        "items_per_s": round(items / p50, 1) if p50 else None,
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+# ==========================================
+# 💾 RESULTS
+# ==========================================
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True).strip()
+    except Exception:
+        return "unknown"
+
+def previous_result(config):
+    if not os.path.exists(RESULTS_FILE):
+        return None
+    last = None
+    with open(RESULTS_FILE, encoding="utf-8") as f:
+        for line in f:
+            row = json.loads(line)
+            if row.get("config") == config:
+                last = row
+    return last
+
+def print_report(results, previous):
+    print(f"\n{'stage':<15}{'items':>8}{'p50 s':>10}{'p95 s':>10}{'items/s':>12}{'peak MB':>10}{'vs prev':>10}")
+    for name, r in results.items():
+        change = ""
+        if previous and name in previous["stages"] and previous["stages"][name]["p50_s"]:
+            delta = (r["p50_s"] / previous["stages"][name]["p50_s"] - 1) * 100
+            change = f"{delta:+.0f}%"
+        print(f"{name:<15}{r['items']:>8}{r['p50_s']:>10}{r['p95_s']:>10}{r['items_per_s']:>12}{r['peak_rss_mb']:>10}{change:>10}")
+    if previous:
+        print(f"\n(compared with {previous['commit']} at {previous['timestamp']})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline AutoX India pipeline benchmark")
+    parser.add_argument("--stages", default="sentinel,processor,processor_incr,generator,enhancer,dashboard_api")
+    parser.add_argument("--feeds", type=int, default=50, help="RSS feeds served from the fixture")
+    parser.add_argument("--topics", type=int, default=2000, help="raw topics seeded for the processor")
+    parser.add_argument("--generate", type=int, default=20, help="topics for generator / enhancer")
+    parser.add_argument("--tweets", type=int, default=2000, help="ready tweets for the dashboard API")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--llm-latency", type=int, default=0, help="simulated LLM latency in ms")
+    parser.add_argument("--real-mongo", action="store_true", help="use BENCH_MONGO_URI even if mongomock is installed")
+    parser.add_argument("--verbose", action="store_true", help="show the stages' own output")
+    parser.add_argument("--no-save", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        import mongomock  # noqa: F401
+        use_mongomock = not args.real_mongo
+    except ImportError:
+        use_mongomock = False
+
+    client, backend = connect(use_mongomock)
+    install_fakes(client, args.feeds, args.llm_latency)
+    db = client[BENCH_DB_NAME]
+
+    config = {k: v for k, v in vars(args).items() if k not in ("verbose", "no_save")}
+    config["backend"] = "mongomock" if use_mongomock else "mongodb"
+    print(f"--- ⏱️ Benchmark on {backend} ({config}) ---")
+
+    stages = bench_stages(args)
+    results = {}
+    for name in [s.strip() for s in args.stages.split(",") if s.strip()]:
+        setup, run = stages[name]
+        print(f"   ▶️ {name}...")
+        results[name] = run_stage(db, setup, run, args.repeat, quiet=not args.verbose)
+
+    previous = previous_result(config)
+    print_report(results, previous)
+
+    if not args.no_save:
+        row = {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "config": config,
+            "stages": results
+        }
+        with open(RESULTS_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(row) + "\n")
+        print(f"   💾 Saved to {os.path.relpath(RESULTS_FILE)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,44 @@
-import os
+import json
+import time
+import asyncio
+import hashlib
 import datetime
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse
+import threading
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
-from pymongo import MongoClient
+from starlette.concurrency import run_in_threadpool
+from db import get_db
+from health import health_report, WINDOW_HOURS
+import metrics
 from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import PyMongoError
 from dotenv import load_dotenv
 
+try:
+    import orjson
+except ImportError:  # optional: faster JSON encoding
+    orjson = None
+
 load_dotenv()
 
 app = FastAPI()
 
-# ⚙️ CONFIGURATION
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = "autox_india"
+# ⚙️ CONFIGURATION (shared pooled client, indexes checked at startup)
+db = get_db()
+
+EVENT_POLL_INTERVAL = 3   # seconds, only used when change streams are unavailable
+EVENT_KEEPALIVE = 15      # seconds between SSE comments so proxies keep the connection
 
-client = MongoClient(MONGO_URI)
-db = client[DB_NAME]
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Only what the SPA renders
+TWEET_PROJECTION = {
+    "topic": 1, "source": 1, "tweet_variants": 1,
+    "generated_at": 1, "enhanced": 1
+}
 
 # Serve static files (css/js if you had them separate, but we'll inline for simplicity)
 # app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -25,35 +47,245 @@ db = client[DB_NAME]
 # 📡 API ENDPOINTS
 # ==========================================
 
+def dump_json(data):
+    if orjson is not None:
+        return orjson.dumps(data, default=str)
+    return json.dumps(data, default=str, ensure_ascii=False).encode("utf-8")
+
+def parse_cursor(cursor):
+    """
+    Cursor format: "<phase>:<last _id>".
+    Phase 1 walks enhanced tweets, phase 0 the rest (so enhanced ones stay on top).
+    """
+    if not cursor:
+        return 1, None
+    try:
+        phase, last_id = cursor.split(":", 1)
+        return int(phase), (ObjectId(last_id) if last_id else None)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def fetch_page(limit, cursor):
+    """Blocking pymongo work, run off the event loop. Returns (tweets, next_cursor)."""
+    phase, last_id = parse_cursor(cursor)
+    tweets = []
+
+    while phase >= 0 and len(tweets) < limit:
+        query = {
+            "status": "ready_for_posting",
+            "enhanced": True if phase == 1 else {"$ne": True}
+        }
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+
+        batch = list(
+            db.final_tweets.find(query, TWEET_PROJECTION)
+            .sort("_id", 1)
+            .limit(limit - len(tweets) + 1)
+        )
+        has_more = len(batch) > limit - len(tweets)
+        batch = batch[:limit - len(tweets)]
+        tweets.extend(batch)
+
+        if has_more:
+            return tweets, f"{phase}:{tweets[-1]['_id']}"
+        phase, last_id = phase - 1, None
+
+    # Page filled exactly at the end of phase 1: next page starts phase 0 from the beginning
+    return tweets, ("0:" if phase == 0 else None)
+
 @app.get("/api/today")
-def get_todays_tweets():
+async def get_todays_tweets(request: Request, limit: int = PAGE_SIZE, cursor: str = None):
     """
-    Fetches all tweets ready for posting.
+    Fetches tweets ready for posting, one page at a time.
     Sorts by 'Enhanced' status so best ones are on top.
+    Next page: X-Next-Cursor header. Unchanged page: 304 via ETag.
     """
-    tweets = list(db.final_tweets.find({
-        "status": "ready_for_posting"
-    }).sort("enhanced", -1))
-    
-    # Convert ObjectId to string for JSON serialization
-    for t in tweets:
-        t["_id"] = str(t["_id"])
-        
-    return tweets
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    tweets, next_cursor = await run_in_threadpool(fetch_page, limit, cursor)
+
+    body = dump_json(tweets)
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# ==========================================
+# 🔔 LIVE EVENTS (Server-Sent Events)
+# ==========================================
+
+class EventHub:
+    """
+    Fans out tweet events from the watcher thread to every connected browser.
+    Each subscriber is an asyncio.Queue owned by the server's event loop.
+    """
+    def __init__(self):
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.loop = None
+
+    def subscribe(self):
+        q = asyncio.Queue(maxsize=1000)
+        with self.lock:
+            self.subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def _deliver(self, event):
+        for q in list(self.subscribers):
+            if q.full():
+                continue  # slow client, it will catch up with a refresh
+            q.put_nowait(event)
+
+    def publish(self, event):
+        """Thread-safe: may be called from the watcher thread or a request handler."""
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._deliver, event)
+
+hub = EventHub()
+
+def tweet_event(kind, doc):
+    payload = {k: doc.get(k) for k in TWEET_PROJECTION if k in doc}
+    payload["_id"] = str(doc["_id"])
+    return {"type": kind, "tweet": payload}
+
+def classify_change(change):
+    """Maps a final_tweets change-stream event to generated / enhanced / posted."""
+    doc = change.get("fullDocument") or {}
+    if change["operationType"] == "insert" and doc.get("status") == "ready_for_posting":
+        return tweet_event("enhanced" if doc.get("enhanced") else "generated", doc)
+
+    updated = (change.get("updateDescription") or {}).get("updatedFields", {})
+    if updated.get("status") == "posted":
+        return {"type": "posted", "tweet": {"_id": str(change["documentKey"]["_id"])}}
+    if updated.get("enhanced") and doc.get("status") == "ready_for_posting":
+        return tweet_event("enhanced", doc)
+    return None
+
+def watch_changes():
+    pipeline = [{"$match": {"operationType": {"$in": ["insert", "update"]}}}]
+    with db.final_tweets.watch(pipeline, full_document="updateLookup") as stream:
+        print("   📡 Live updates: MongoDB change stream.")
+        for change in stream:
+            event = classify_change(change)
+            if event:
+                hub.publish(event)
+
+def poll_changes():
+    print(f"   📡 Live updates: polling every {EVENT_POLL_INTERVAL}s (no change streams).")
+    since = datetime.datetime.now()
+    while True:
+        time.sleep(EVENT_POLL_INTERVAL)
+        now = datetime.datetime.now()
+        try:
+            for field, kind in (("generated_at", "generated"), ("enhanced_at", "enhanced"), ("posted_at", "posted")):
+                for doc in db.final_tweets.find({field: {"$gt": since, "$lte": now}}, TWEET_PROJECTION):
+                    hub.publish(tweet_event(kind, doc) if kind != "posted" else {"type": "posted", "tweet": {"_id": str(doc["_id"])}})
+            since = now
+        except PyMongoError as e:
+            print(f"   ❌ Live update poll failed: {e}")
+
+def run_watcher():
+    try:
+        watch_changes()
+    except PyMongoError as e:
+        print(f"   ⚠️ Change streams unavailable ({e}).")
+    poll_changes()
+
+@app.on_event("startup")
+async def start_event_watcher():
+    hub.loop = asyncio.get_running_loop()
+    threading.Thread(target=run_watcher, name="dashboard-events", daemon=True).start()
+
+@app.get("/api/events")
+async def stream_events(request: Request):
+    """
+    SSE stream of tweet events: generated, enhanced, posted.
+    The SPA patches only the affected card.
+    """
+    async def event_stream():
+        q = hub.subscribe()
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(q.get(), timeout=EVENT_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {dump_json(event['tweet']).decode('utf-8')}\n\n"
+        finally:
+            hub.unsubscribe(q)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# ==========================================
+# 📊 METRICS (Prometheus)
+# ==========================================
+
+def pipeline_backlog():
+    """(count series, oldest-age series) from the single-aggregation health report."""
+    try:
+        backlog = health_report(db)["backlog"]
+    except PyMongoError:
+        return {}, {}
+    counts = {(stage,): b["count"] for stage, b in backlog.items()}
+    ages = {(stage,): b["oldest_age_s"] for stage, b in backlog.items() if b["oldest_age_s"] is not None}
+    return counts, ages
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Prometheus scrape target: LLM latency/sizes/fallbacks, Mongo op latency,
+    stage timings and items from every pipeline process, plus live backlog.
+    """
+    backlog, ages = await run_in_threadpool(pipeline_backlog)
+    body = await run_in_threadpool(metrics.render, {
+        "autox_pipeline_backlog": ("Documents waiting for each stage", backlog, ["stage"]),
+        "autox_pipeline_oldest_pending_seconds": ("Age of the oldest document waiting for each stage", ages, ["stage"])
+    })
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+@app.get("/api/health")
+async def pipeline_health(hours: int = WINDOW_HOURS):
+    """
+    Per-stage backlog, oldest pending age, status breakdown and hourly throughput
+    (one aggregation; cheap enough to poll from monitoring).
+    """
+    try:
+        report = await run_in_threadpool(health_report, db, max(1, min(hours, 24 * 7)))
+    except PyMongoError as e:
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {e}")
+    return Response(dump_json(report), media_type="application/json")
 
 @app.post("/api/mark_posted/{tweet_id}")
-def mark_as_posted(tweet_id: str):
+async def mark_as_posted(tweet_id: str):
     """
     Archives a tweet so it disappears from the dashboard.
     """
-    result = db.final_tweets.update_one(
-        {"_id": ObjectId(tweet_id)},
+    try:
+        oid = ObjectId(tweet_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Tweet not found")
+
+    result = await run_in_threadpool(
+        db.final_tweets.update_one,
+        {"_id": oid},
         {"$set": {
             "status": "posted",
             "posted_at": datetime.datetime.now()
         }}
     )
     if result.modified_count == 1:
+        # Tell other editors right away (the watcher may also report it; removal is idempotent)
+        hub.publish({"type": "posted", "tweet": {"_id": tweet_id}})
         return {"msg": "Success"}
     raise HTTPException(status_code=404, detail="Tweet not found")
 
@@ -94,23 +326,41 @@ def serve_dashboard():
             </div>
 
             <div id="tweets-container" class="space-y-12"></div>
+
+            <div class="text-center">
+                <button id="load-more" onclick="loadMore()" class="hidden bg-slate-700 hover:bg-slate-600 px-4 py-2 rounded text-sm font-semibold">
+                    <i class="fas fa-chevron-down"></i> Load more
+                </button>
+            </div>
         </main>
 
         <script>
+            let nextCursor = null;
+
+            // One page of /api/today; the server sends X-Next-Cursor when more are left
+            async function fetchPage(cursor) {
+                const url = cursor ? '/api/today?cursor=' + encodeURIComponent(cursor) : '/api/today';
+                const res = await fetch(url);
+                nextCursor = res.headers.get('X-Next-Cursor');
+                document.getElementById('load-more').classList.toggle('hidden', !nextCursor);
+                return res.json();
+            }
+
+            async function loadMore() {
+                if (!nextCursor) return;
+                const tweets = await fetchPage(nextCursor);
+                tweets.forEach(renderTweetBlock);
+            }
+
             async function loadTweets() {
                 document.getElementById('loading').classList.remove('hidden');
                 document.getElementById('tweets-container').innerHTML = '';
 
                 try {
-                    const res = await fetch('/api/today');
-                    const tweets = await res.json();
+                    const tweets = await fetchPage(null);
 
                     if (tweets.length === 0) {
-                        document.getElementById('tweets-container').innerHTML = `
-                            <div class="text-center text-slate-500 py-10">
-                                <h2 class="text-xl">✅ All Caught Up!</h2>
-                                <p>No tweets pending review.</p>
-                            </div>`;
+                        showEmptyState();
                         return;
                     }
 
@@ -124,11 +374,23 @@ def serve_dashboard():
                 }
             }
 
+            function showEmptyState() {
+                document.getElementById('tweets-container').innerHTML = `
+                    <div id="empty-state" class="text-center text-slate-500 py-10">
+                        <h2 class="text-xl">✅ All Caught Up!</h2>
+                        <p>No tweets pending review.</p>
+                    </div>`;
+            }
+
             function renderTweetBlock(doc) {
                 const container = document.getElementById('tweets-container');
+                const existing = document.getElementById('tweet-' + doc._id);
+                const empty = document.getElementById('empty-state');
+                if (empty) empty.remove();
                 
                 // TOPIC HEADER
                 const section = document.createElement('section');
+                section.id = 'tweet-' + doc._id;
                 section.className = "bg-slate-800 rounded-xl p-6 border border-slate-700 shadow-lg";
                 
                 let variantsHtml = '';
@@ -198,7 +460,24 @@ def serve_dashboard():
                     </div>
                 `;
 
-                container.appendChild(section);
+                // Live updates replace the card in place instead of re-rendering the list
+                if (existing) existing.replaceWith(section);
+                else container.appendChild(section);
+            }
+
+            function removeTweetBlock(id) {
+                const section = document.getElementById('tweet-' + id);
+                if (section) section.remove();
+                if (!document.querySelector('#tweets-container section')) showEmptyState();
+            }
+
+            // --- LIVE UPDATES (Server-Sent Events) ---
+
+            function listenForUpdates() {
+                const events = new EventSource('/api/events');
+                events.addEventListener('generated', e => renderTweetBlock(JSON.parse(e.data)));
+                events.addEventListener('enhanced', e => renderTweetBlock(JSON.parse(e.data)));
+                events.addEventListener('posted', e => removeTweetBlock(JSON.parse(e.data)._id));
             }
 
             // --- UTILS ---
@@ -218,11 +497,12 @@ def serve_dashboard():
                 if(!confirm("Did you post this? It will be removed from the list.")) return;
                 
                 await fetch('/api/mark_posted/' + id, { method: 'POST' });
-                loadTweets(); // Reload
+                removeTweetBlock(id); // No full reload needed
             }
 
             // Init
             loadTweets();
+            listenForUpdates();
         </script>
     </body>
     </html>
@@ -0,0 +1,195 @@
+import os
+import datetime
+import threading
+from pymongo import MongoClient, UpdateOne, ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+MONGO_URI = os.getenv("MONGO_URI")
+DB_NAME = "autox_india"
+
+# One pooled client per process; every step shares it
+POOL_SETTINGS = {
+    "maxPoolSize": int(os.getenv("MONGO_MAX_POOL_SIZE", "50")),
+    "minPoolSize": int(os.getenv("MONGO_MIN_POOL_SIZE", "2")),
+    "maxIdleTimeMS": int(os.getenv("MONGO_MAX_IDLE_MS", "60000")),
+    "serverSelectionTimeoutMS": int(os.getenv("MONGO_SELECT_TIMEOUT_MS", "10000")),
+    "connectTimeoutMS": int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000")),
+    "retryWrites": True
+}
+
+# Retention: MongoDB drops hot data past these ages (retention.py archives it to disk first)
+HOT_TTL_DAYS = int(os.getenv("HOT_TTL_DAYS", "14"))        # raw_topics, top_topics, processor bookkeeping
+POSTED_TTL_DAYS = int(os.getenv("POSTED_TTL_DAYS", "30"))  # posted final_tweets only
+HOT_TTL = HOT_TTL_DAYS * 86400
+POSTED_TTL = POSTED_TTL_DAYS * 86400
+# top_topics statuses that mean Step 3 is done with the topic
+DONE_TOPIC_STATUSES = ["completed", "displaced", "dead_letter"]
+
+# ==========================================
+# 📇 INDEXES (hot queries + upsert keys)
+# ==========================================
+
+# collection -> [(keys, options)]
+INDEXES = {
+    "raw_topics": [
+        ([("title", ASCENDING)], {"name": "title_unique", "unique": True}),
+        ([("collected_at", ASCENDING)], {"name": "collected_at"}),
+        ([("updated_at", ASCENDING)], {"name": "updated_at", "expireAfterSeconds": HOT_TTL})
+    ],
+    "top_topics": [
+        ([("title", ASCENDING), ("date", ASCENDING)], {"name": "title_date_unique", "unique": True}),
+        ([("status", ASCENDING)], {"name": "status"}),
+        ([("date", ASCENDING), ("score", DESCENDING)], {"name": "date_score"}),
+        # Only finished topics expire; one still waiting for Step 3 stays however old it is
+        # ($in in a partial filter needs MongoDB 6.0+)
+        ([("created_at", ASCENDING)], {"name": "created_at_done_ttl", "expireAfterSeconds": HOT_TTL,
+                                        "partialFilterExpression": {"status": {"$in": DONE_TOPIC_STATUSES}}})
+    ],
+    "final_tweets": [
+        # Dashboard pages: status + enhanced equality, then _id range
+        ([("status", ASCENDING), ("enhanced", ASCENDING), ("_id", ASCENDING)], {"name": "status_enhanced_id"}),
+        # One output per topic: the generator upserts on topic_id (older documents have none)
+        ([("topic_id", ASCENDING)], {"name": "topic_id_unique", "unique": True,
+                                      "partialFilterExpression": {"topic_id": {"$exists": True}}}),
+        # Only posted tweets have posted_at, so nothing waiting for review ever expires
+        ([("posted_at", ASCENDING)], {"name": "posted_at_ttl", "expireAfterSeconds": POSTED_TTL})
+    ],
+    "topic_scores": [
+        # Processor's running top-k per day
+        ([("date", ASCENDING), ("score", DESCENDING), ("_id", ASCENDING)], {"name": "date_score_id"}),
+        ([("scored_at", ASCENDING)], {"name": "scored_at_ttl", "expireAfterSeconds": HOT_TTL})
+    ],
+    "processor_state": [
+        ([("updated_at", ASCENDING)], {"name": "updated_at_ttl", "expireAfterSeconds": HOT_TTL})
+    ],
+    "feed_state": [
+        ([("url", ASCENDING)], {"name": "url_unique", "unique": True})
+    ]
+}
+
+# Replaced indexes, dropped by ensure_indexes (options like partialFilterExpression can't be changed in place)
+OBSOLETE_INDEXES = {
+    "top_topics": ["created_at_ttl"]   # expired topics still waiting for Step 3
+}
+
+# TTL/archive fields that older documents don't have yet: collection -> (field, ISO date field to derive it from)
+BACKFILLS = {
+    "raw_topics": ("updated_at", "collected_at")   # stamped by sentinel since incremental scoring
+}
+BACKFILL_BATCH = 1000
+
+_STATE = {"client": None, "indexes_checked": False}
+_LOCK = threading.Lock()
+
+def get_client():
+    with _LOCK:
+        if _STATE["client"] is None:
+            if not MONGO_URI:
+                raise ValueError("❌ MONGO_URI not found in .env file")
+            listeners = [metrics.MongoMetricsListener()] if metrics.MongoMetricsListener else []
+            _STATE["client"] = MongoClient(MONGO_URI, event_listeners=listeners, **POOL_SETTINGS)
+            # Any process that talks to Mongo records metrics; publish them for /metrics
+            metrics.start_flusher()
+        return _STATE["client"]
+
+def get_db(ensure=True):
+    """Shared database handle. Indexes are checked the first time it is requested."""
+    db = get_client()[DB_NAME]
+    if ensure and not _STATE["indexes_checked"]:
+        ensure_indexes(db)
+    return db
+
+def backfill_time_fields(db, verbose=False):
+    """
+    Gives documents without the retention time field one derived from their date,
+    so the TTL index and retention.py see them (falls back to now when the date is missing).
+    Returns {collection: documents updated}.
+    """
+    counts = {}
+    for collection, (field, date_field) in BACKFILLS.items():
+        done = 0
+        try:
+            while True:
+                batch = list(db[collection].find({field: None}, {date_field: 1}).limit(BACKFILL_BATCH))
+                if not batch:
+                    break
+                operations = []
+                for doc in batch:
+                    try:
+                        stamp = datetime.datetime.fromisoformat(str(doc.get(date_field)))
+                    except ValueError:
+                        stamp = datetime.datetime.now()
+                    operations.append(UpdateOne({"_id": doc["_id"], field: None}, {"$set": {field: stamp}}))
+                db[collection].bulk_write(operations, ordered=False)
+                done += len(batch)
+        except PyMongoError as e:
+            print(f"   ⚠️ Could not backfill {collection}.{field}: {e}")
+        if done:
+            counts[collection] = done
+            if verbose:
+                print(f"   🩹 Backfilled {field} on {done} {collection} documents")
+    return counts
+
+def ensure_indexes(db, verbose=False):
+    """
+    Creates any missing index, updates TTLs that changed, backfills the time fields
+    TTLs depend on, and reports the indexes that could not be built (e.g. a unique
+    index over existing duplicates).
+    Returns {collection: [missing index names]}.
+    """
+    missing = {}
+    for collection, indexes in INDEXES.items():
+        try:
+            existing = {ix["name"]: ix for ix in db[collection].list_indexes()}
+        except PyMongoError as e:
+            print(f"   ⚠️ Could not list indexes on {collection}: {e}")
+            continue
+
+        for keys, options in indexes:
+            if options["name"] in existing:
+                ttl = options.get("expireAfterSeconds")
+                if ttl is not None and existing[options["name"]].get("expireAfterSeconds") != ttl:
+                    # Also turns an older plain index into a TTL one
+                    try:
+                        db.command("collMod", collection, index={"name": options["name"], "expireAfterSeconds": ttl})
+                        if verbose:
+                            print(f"   ⏳ Set TTL on {collection}.{options['name']} to {ttl}s")
+                    except PyMongoError as e:
+                        missing.setdefault(collection, []).append(options["name"])
+                        print(f"   ⚠️ TTL on {collection}.{options['name']} not set: {e}")
+                continue
+            try:
+                db[collection].create_index(keys, **options)
+                if verbose:
+                    print(f"   📇 Created index {collection}.{options['name']}")
+            except PyMongoError as e:
+                missing.setdefault(collection, []).append(options["name"])
+                print(f"   ⚠️ Index {collection}.{options['name']} not built: {e}")
+
+    for collection, names in OBSOLETE_INDEXES.items():
+        try:
+            existing = {ix["name"] for ix in db[collection].list_indexes()}
+            for name in names:
+                if name in existing:
+                    db[collection].drop_index(name)
+                    if verbose:
+                        print(f"   🗑️ Dropped obsolete index {collection}.{name}")
+        except PyMongoError as e:
+            print(f"   ⚠️ Could not drop obsolete indexes on {collection}: {e}")
+
+    backfill_time_fields(db, verbose)
+    _STATE["indexes_checked"] = True
+    return missing
+
+if __name__ == "__main__":
+    print("--- 📇 Checking MongoDB indexes ---")
+    problems = ensure_indexes(get_db(ensure=False), verbose=True)
+    print("--- ✅ All indexes present. ---" if not problems else f"--- ❌ Missing: {problems} ---")
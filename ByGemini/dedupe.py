@@ -0,0 +1,184 @@
+import os
+import re
+import threading
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+# Two titles are the same story if their word sets overlap this much
+NEAR_DUP_JACCARD = float(os.getenv("NEAR_DUP_JACCARD", "0.5"))
+# ...or if the shorter one is (almost) contained in the longer one, e.g. a trend hashtag
+NEAR_DUP_CONTAINMENT = float(os.getenv("NEAR_DUP_CONTAINMENT", "0.8"))
+# Tokens shared by more titles than this are too common to find candidates with
+MAX_POSTINGS = 200
+
+STOPWORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "to", "for", "from", "by", "with", "and", "or",
+    "is", "are", "was", "were", "be", "as", "after", "over", "says", "said", "new", "amid",
+    "news", "latest", "today", "live", "updates", "update", "video", "watch", "hai", "ki", "ka", "ke"
+}
+
+# ==========================================
+# ✂️ SHINGLING
+# ==========================================
+
+CAMEL_CASE = re.compile(r"(?<=[a-z])(?=[A-Z])")
+NON_WORD = re.compile(r"[^\w\s]")
+
+def shingles(title):
+    """
+    Normalised word set of a headline.
+    '#RamMandir' -> {'ram', 'mandir'}, 'Temples' -> 'temple'.
+    """
+    text = CAMEL_CASE.sub(" ", title or "")
+    text = NON_WORD.sub(" ", text.replace("#", " ")).lower()
+    words = set()
+    for word in text.split():
+        if word in STOPWORDS or len(word) < 2:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return words
+
+def entities(title):
+    """
+    Shingles of the capitalised words in a headline (names, places, parties, BJP).
+    Title Case headlines mark every word, which only makes merging stricter.
+    """
+    text = CAMEL_CASE.sub(" ", title or "")
+    capitalised = " ".join(w for w in NON_WORD.sub(" ", text.replace("#", " ")).split() if w[:1].isupper())
+    return shingles(capitalised)
+
+def similarity(a, b):
+    """(jaccard, containment) of two shingle sets."""
+    if not a or not b:
+        return 0.0, 0.0
+    common = len(a & b)
+    return common / len(a | b), common / min(len(a), len(b))
+
+def is_near_duplicate(a, b, entities_a=frozenset(), entities_b=frozenset()):
+    """
+    a, b: shingle sets; entities_a/b: their entity shingles.
+    Overlap alone is not enough: when each side has an entity the other lacks
+    ("BJP wins Delhi election" / "Congress wins Delhi election") it is another story.
+    """
+    jaccard, containment = similarity(a, b)
+    if not (jaccard >= NEAR_DUP_JACCARD or (min(len(a), len(b)) >= 2 and containment >= NEAR_DUP_CONTAINMENT)):
+        return False
+    return not ((a - b) & entities_a and (b - a) & entities_b)
+
+# ==========================================
+# 🗂️ DAILY STORY INDEX
+# ==========================================
+
+class StoryIndex:
+    """
+    In-memory index of today's canonical stories.
+    Inverted index (token -> story ids) finds candidates; shingled
+    Jaccard/containment decides whether a headline is the same story.
+    """
+    def __init__(self, day):
+        self.day = day
+        self.stories = []        # [{"title", "shingles", "entities", "x_trending", "trend_rank"}]
+        self.by_title = {}       # exact title or alias -> story id
+        self.postings = {}       # token -> [story ids]
+        self.lock = threading.Lock()
+
+    def add(self, title, x_trending=False, trend_rank=0, aliases=()):
+        story_id = len(self.stories)
+        words = shingles(title)
+        self.stories.append({
+            "title": title,
+            "shingles": words,
+            "entities": entities(title),
+            "x_trending": bool(x_trending),
+            "trend_rank": trend_rank or 0
+        })
+        for name in (title, *aliases):
+            self.by_title[name] = story_id
+        for word in words:
+            self.postings.setdefault(word, []).append(story_id)
+        return self.stories[story_id]
+
+    def find(self, title):
+        """Canonical story for a headline, or None if it is a new story."""
+        if title in self.by_title:
+            return self.stories[self.by_title[title]]
+
+        words = shingles(title)
+        names = entities(title)
+        candidates = set()
+        for word in words:
+            ids = self.postings.get(word, [])
+            if len(ids) <= MAX_POSTINGS:
+                candidates.update(ids)
+
+        best, best_score = None, 0.0
+        for story_id in candidates:
+            story = self.stories[story_id]
+            if is_near_duplicate(words, story["shingles"], names, story["entities"]):
+                score = similarity(words, story["shingles"])[0]
+                if score > best_score:
+                    best, best_score = story, score
+        return best
+
+    def resolve(self, title, x_trending=False, trend_rank=0):
+        """
+        Returns (canonical story, is_new). A near-duplicate headline is recorded
+        as an alias of its story, and its trend signal is merged in.
+        """
+        with self.lock:
+            story = self.find(title)
+            if story is None:
+                return self.add(title, x_trending, trend_rank), True
+
+            self.by_title[title] = self.by_title[story["title"]]
+            if x_trending:
+                story["x_trending"] = True
+                if trend_rank and (not story["trend_rank"] or trend_rank < story["trend_rank"]):
+                    story["trend_rank"] = trend_rank
+            return story, False
+
+_INDEX = {"instance": None}
+_INDEX_LOCK = threading.Lock()
+
+def get_story_index(collection, day):
+    """
+    Today's index, rebuilt from raw_topics the first time it is needed
+    (and again when the date changes), so restarts keep the clusters.
+    """
+    with _INDEX_LOCK:
+        index = _INDEX["instance"]
+        if index is None or index.day != day:
+            index = StoryIndex(day)
+            cursor = collection.find(
+                {"collected_at": day},
+                {"_id": 0, "title": 1, "x_trending": 1, "trend_rank": 1, "aliases": 1}
+            )
+            for doc in cursor:
+                index.add(doc["title"], doc.get("x_trending"), doc.get("trend_rank"), doc.get("aliases") or ())
+            _INDEX["instance"] = index
+        return index
+
+# (headline, headline, same story?)
+SELF_CHECKS = [
+    ("BJP wins Delhi election", "Congress wins Delhi election", False),
+    ("Modi visits China", "Modi visits Russia", False),
+    ("India beats Pakistan in final", "India beats Australia in final", False),
+    ("#RamMandir", "Ram Mandir inauguration in Ayodhya", True),
+    ("PM Modi visits China", "Modi visits China for border talks", True),
+    ("Ayodhya Ram Mandir inauguration today", "Ram Mandir inauguration in Ayodhya", True),
+]
+
+if __name__ == "__main__":
+    print("--- 🔗 Checking near-duplicate detection ---")
+    failures = 0
+    for first, second, expected in SELF_CHECKS:
+        got = is_near_duplicate(shingles(first), shingles(second), entities(first), entities(second))
+        if got != expected:
+            failures += 1
+            print(f"   ❌ {first!r} / {second!r}: expected {expected}, got {got}")
+    print("--- ✅ All dedupe checks passed. ---" if not failures else f"--- ❌ {failures} check(s) failed. ---")
+    raise SystemExit(1 if failures else 0)
@@ -1,15 +1,25 @@
 import os
-from pymongo import MongoClient
+import json
+import datetime
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import UpdateOne
+from db import get_db
 from dotenv import load_dotenv
-import google.generativeai as genai
-from google.api_core.exceptions import NotFound
+from llm_cache import get_cache
+from gemini_client import get_resolver
+from work_queue import claim_many, fail, release, leased, LEASE_FIELDS
+import metrics
 
 load_dotenv()
 
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = "autox_india"
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEMINI_API_KEY)
+
+# Batched quote comments: documents per Gemini request, and requests in flight
+QUOTE_BATCH_DOCS = int(os.getenv("QUOTE_BATCH_DOCS", "5"))
+ENHANCER_CONCURRENCY = int(os.getenv("ENHANCER_CONCURRENCY", "3"))
+
+PENDING_TWEETS = {"status": "ready_for_posting", "enhanced": {"$ne": True}, "enhance_status": {"$ne": "dead_letter"}}
+# Tweets whose enhancement keeps failing stay reviewable, they just stop being retried
+ENHANCE_DEAD_LETTER = {"enhance_status": "dead_letter"}
 
 # ... [Keep your existing RETWEET_ACCOUNTS and IMAGE_SUFFIXES dicts here] ...
 # (Or just copy the full file below if you want to be safe)
@@ -49,63 +59,154 @@ def get_smart_image_keyword(topic_title, category_str):
     clean_topic = "".join(e for e in topic_title if e.isalnum() or e.isspace())
     return f"{clean_topic} {suffix}"
 
+QUOTE_FALLBACK = "Ye update important hai, zaroor padhein."
+
 def generate_quote_comment(tweet_text):
     """
-    Safe Gemini call with Fallback
+    Safe Gemini call with Fallback (cached, so re-runs don't pay twice)
     """
     prompt = f"Read this tweet: '{tweet_text}'. Write a 1-line Quote-Retweet comment in HINGLISH (Max 10 words, Nationalist/Deshbhakt tone). No hashtags."
     
-    models_to_try = ['gemini-1.5-flash', 'gemini-1.5-flash-001', 'gemini-pro']
-    
-    for model_name in models_to_try:
+    gemini = get_resolver()
+
+    def comment():
+        try:
+            with metrics.span("generate_quote_comment"):
+                return gemini.generate(prompt).strip().replace('"', '')
+        except Exception as e:
+            print(f"     ⚠️ Quote comment failed: {e}")
+            return None
+
+    result = get_cache().get_or_call("gemini", "/".join(gemini.models), prompt, None, comment)
+    return result or QUOTE_FALLBACK # Hard fallback
+
+def generate_quote_comments(tweet_texts):
+    """
+    Batched version of generate_quote_comment: one structured-JSON Gemini request
+    for many tweets. Answers are mapped back by index; any tweet the batch
+    misses gets a single call instead.
+    """
+    if not tweet_texts:
+        return []
+
+    numbered = json.dumps([{"index": i, "tweet": t} for i, t in enumerate(tweet_texts)], ensure_ascii=False)
+    prompt = (
+        "For EACH tweet below, write a 1-line Quote-Retweet comment in HINGLISH "
+        "(Max 10 words, Nationalist/Deshbhakt tone). No hashtags.\n"
+        'Reply as JSON: {"comments": [{"index": <index>, "comment": "<comment>"}]}\n'
+        f"Tweets: {numbered}"
+    )
+    generation_config = {"response_mime_type": "application/json"}
+
+    gemini = get_resolver()
+
+    def batch():
         try:
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(prompt)
-            return response.text.strip().replace('"', '')
-        except:
+            with metrics.span("generate_quote_comments", tweets=len(tweet_texts)):
+                return json.loads(gemini.generate(prompt, generation_config)).get("comments", [])
+        except Exception as e:
+            print(f"     ⚠️ Batched quote comments failed: {e}")
+            return None
+
+    answers = get_cache().get_or_call("gemini", "/".join(gemini.models), prompt, generation_config, batch) or []
+
+    comments = [None] * len(tweet_texts)
+    for item in answers:
+        try:
+            idx = int(item.get("index"))
+            text = str(item.get("comment", "")).strip().replace('"', '')
+        except (AttributeError, TypeError, ValueError):
             continue
-            
-    return "Ye update important hai, zaroor padhein." # Hard fallback
+        if 0 <= idx < len(comments) and text:
+            comments[idx] = text
 
-def run_enhancer():
-    print("--- 🧠 Step 4: Intelligence Enhancer Started ---")
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
-    
-    pending_docs = list(db.final_tweets.find({
-        "status": "ready_for_posting",
-        "enhanced": {"$ne": True}
-    }))
-    
-    if not pending_docs:
-        print("   💤 No new tweets to enhance.")
-        return
+    return [c or generate_quote_comment(tweet_texts[i]) for i, c in enumerate(comments)]
 
-    print(f"   ⚡ Enhancing {len(pending_docs)} tweet packages...")
+def enhanceable(doc):
+    """Refine-mode and older documents are not schema-checked: every variant needs its tweet text."""
+    variants = doc.get('tweet_variants')
+    return isinstance(variants, list) and all(
+        isinstance(v, dict) and isinstance(v.get('tweet'), str) and v['tweet'].strip() for v in variants
+    )
 
-    for doc in pending_docs:
+def enhance_batch(db, docs):
+    """
+    Enhances a group of documents with one quote-comment request
+    and one bulk write.
+    """
+    texts = [v['tweet'] for doc in docs for v in doc.get('tweet_variants', [])]
+    comments = iter(generate_quote_comments(texts))
+
+    operations = []
+    for doc in docs:
         topic_title = doc.get('topic', '')
-        variants = doc.get('tweet_variants', [])
         enhanced_variants = []
 
         print(f"   🔹 Processing: {topic_title[:30]}...")
 
-        for v in variants:
-            smart_image = get_smart_image_keyword(topic_title, "General")
-            smart_retweet = get_smart_retweet_target("General")
-            quote_comment = generate_quote_comment(v['tweet'])
-            
-            v['image_keyword'] = smart_image
-            v['retweet_suggestion'] = smart_retweet
-            v['quote_comment'] = quote_comment
+        for v in doc.get('tweet_variants', []):
+            v['image_keyword'] = get_smart_image_keyword(topic_title, "General")
+            v['retweet_suggestion'] = get_smart_retweet_target("General")
+            v['quote_comment'] = next(comments)
             enhanced_variants.append(v)
-            
-        db.final_tweets.update_one(
-            {"_id": doc['_id']},
-            {"$set": {"tweet_variants": enhanced_variants, "enhanced": True}}
-        )
-        print("      ✅ Done.")
 
+        # Guarded on enhanced, so a document enhanced twice (lost lease) is only written once
+        operations.append(UpdateOne(
+            {"_id": doc['_id'], "enhanced": {"$ne": True}},
+            {
+                "$set": {"tweet_variants": enhanced_variants, "enhanced": True, "enhanced_at": datetime.datetime.now()},
+                "$unset": LEASE_FIELDS
+            }
+        ))
+
+    if operations:
+        db.final_tweets.bulk_write(operations, ordered=False)
+    metrics.STAGE_ITEMS.labels(stage="enhancer").inc(len(operations))
+    return len(operations)
+
+def run_enhancer(db=None):
+    print("--- 🧠 Step 4: Intelligence Enhancer Started ---")
+    if db is None:
+        db = get_db()
+    
+    batch_size = max(1, QUOTE_BATCH_DOCS)
+
+    def worker():
+        """Claims batches until none are left, so several enhancer processes can share the queue."""
+        enhanced = 0
+        while True:
+            docs = claim_many(db.final_tweets, PENDING_TWEETS, batch_size)
+            if not docs:
+                return enhanced
+
+            # A malformed document would fail the whole batch with it: set it aside on its own
+            for doc in [d for d in docs if not enhanceable(d)]:
+                print(f"      ⚠️ Not enhanceable (malformed tweet_variants): {doc.get('topic', '')[:30]}...")
+                release(db.final_tweets, doc['_id'], {"$set": ENHANCE_DEAD_LETTER})
+            docs = [d for d in docs if enhanceable(d)]
+            if not docs:
+                continue
+            try:
+                with leased(db.final_tweets, [d['_id'] for d in docs]):
+                    count = enhance_batch(db, docs)
+                print(f"      ✅ Done ({count} docs).")
+                enhanced += count
+            except Exception as e:
+                print(f"      ❌ Batch failed: {e}")
+                for doc in docs:
+                    # A tweet that can't be enhanced still goes to review, just without quotes
+                    fail(db.final_tweets, doc['_id'], dead_letter=ENHANCE_DEAD_LETTER)
+
+    with ThreadPoolExecutor(max_workers=max(1, ENHANCER_CONCURRENCY)) as pool:
+        total = sum(future.result() for future in [pool.submit(worker) for _ in range(max(1, ENHANCER_CONCURRENCY))])
+
+    if not total:
+        print("   💤 No new tweets to enhance.")
+        return
+
+    print(f"   ⚡ Enhanced {total} tweet packages.")
+    print(f"   💾 LLM Cache: {get_cache().stats()}")
+    print(f"   🔁 Gemini: {get_resolver().stats()}")
     print("--- 🏁 Enhancement Complete. ---")
 
 if __name__ == "__main__":
@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+import metrics
+
+load_dotenv()
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+GEMINI_MODELS = [m.strip() for m in os.getenv("GEMINI_MODELS", "gemini-1.5-flash,gemini-1.5-flash-001,gemini-pro").split(",") if m.strip()]
+# Optional REST endpoint override, e.g. the local simulator (simulator.py)
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+BREAKER_BASE_DELAY = 30        # seconds a model is skipped after its first failure
+BREAKER_MAX_DELAY = 15 * 60    # backoff cap for transient errors
+BREAKER_PERMANENT_DELAY = 3600 # 404 / permission errors won't fix themselves soon
+
+PERMANENT_ERRORS = (
+    google_exceptions.NotFound,
+    google_exceptions.PermissionDenied
+)
+
+# Failures that say something about the model (gone, quota, 5xx, too slow) and open its circuit.
+# Anything else (InvalidArgument, a safety-blocked response.text ValueError, ...) is about the
+# request, would fail on every model too, and is raised to the caller as is.
+MODEL_ERRORS = PERMANENT_ERRORS + (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServerError,
+    google_exceptions.DeadlineExceeded,
+    TimeoutError,
+    ConnectionError
+)
+
+class GeminiUnavailable(Exception):
+    pass
+
+# ==========================================
+# 🔁 MODEL RESOLVER + CIRCUIT BREAKER
+# ==========================================
+
+class GeminiResolver:
+    """
+    Tries GEMINI_MODELS in order, but remembers which one works.
+    - GenerativeModel objects are built once and reused.
+    - A failing model is skipped (circuit open) for an exponentially growing delay.
+    - Every fallback is logged with its reason and counted in stats().
+    """
+    def __init__(self, models=None):
+        self.models = list(models or GEMINI_MODELS)
+        self.clients = {}
+        self.health = {name: {"failures": 0, "open_until": 0.0, "last_error": None} for name in self.models}
+        self.preferred = self.models[0] if self.models else None
+        self.fallbacks = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def get_model(self, name):
+        with self.lock:
+            if name not in self.clients:
+                self.clients[name] = genai.GenerativeModel(name)
+            return self.clients[name]
+
+    def candidates(self):
+        """Preferred model first, then the rest; open circuits are left out."""
+        now = time.time()
+        with self.lock:
+            order = [self.preferred] + [m for m in self.models if m != self.preferred]
+            return [m for m in order if m and self.health[m]["open_until"] <= now]
+
+    def record_success(self, name):
+        with self.lock:
+            self.health[name].update(failures=0, open_until=0.0, last_error=None)
+            self.preferred = name
+
+    def record_failure(self, name, error):
+        with self.lock:
+            state = self.health[name]
+            state["failures"] += 1
+            state["last_error"] = f"{type(error).__name__}: {error}"
+            if isinstance(error, PERMANENT_ERRORS):
+                delay = BREAKER_PERMANENT_DELAY
+            else:
+                delay = min(BREAKER_BASE_DELAY * 2 ** (state["failures"] - 1), BREAKER_MAX_DELAY)
+            state["open_until"] = time.time() + delay
+            return delay
+
+    def generate(self, prompt, generation_config=None):
+        """
+        Returns response.text from the first healthy model.
+        Raises GeminiUnavailable (with every model's reason) when none answers,
+        and request-level errors unchanged without counting them against the model.
+        """
+        with self.lock:
+            self.calls += 1
+
+        reasons = []
+        for name in self.candidates():
+            try:
+                model = self.get_model(name)
+                with metrics.llm_call("gemini", name, prompt) as call:
+                    if generation_config:
+                        response = model.generate_content(prompt, generation_config=generation_config)
+                    else:
+                        response = model.generate_content(prompt)
+                    call["response"] = text = response.text
+            except MODEL_ERRORS as e:
+                delay = self.record_failure(name, e)
+                reasons.append(f"{name}: {type(e).__name__}: {e}")
+                print(f"     ⚠️ Gemini fallback: {name} failed ({type(e).__name__}: {str(e)[:80]}), skipping it for {delay:.0f}s")
+                with self.lock:
+                    self.fallbacks += 1
+                metrics.LLM_FALLBACKS.labels(backend="gemini", model=name).inc()
+                continue
+
+            self.record_success(name)
+            return text
+
+        if not reasons:
+            reasons = [f"{name}: circuit open ({self.health[name]['last_error']})" for name in self.models]
+        raise GeminiUnavailable("; ".join(reasons))
+
+    def stats(self):
+        now = time.time()
+        with self.lock:
+            return {
+                "preferred": self.preferred,
+                "calls": self.calls,
+                "fallbacks": self.fallbacks,
+                "models": {
+                    name: {
+                        "failures": state["failures"],
+                        "open": state["open_until"] > now,
+                        "last_error": state["last_error"]
+                    }
+                    for name, state in self.health.items()
+                }
+            }
+
+_RESOLVER = {"instance": None}
+_RESOLVER_LOCK = threading.Lock()
+
+def get_resolver():
+    """Process-wide resolver shared by generator.py and enhancer.py."""
+    with _RESOLVER_LOCK:
+        if _RESOLVER["instance"] is None:
+            if GEMINI_API_ENDPOINT:
+                genai.configure(api_key=GEMINI_API_KEY or "simulator", transport="rest",
+                                client_options={"api_endpoint": GEMINI_API_ENDPOINT})
+            else:
+                genai.configure(api_key=GEMINI_API_KEY)
+            _RESOLVER["instance"] = GeminiResolver()
+        return _RESOLVER["instance"]
@@ -1,11 +1,20 @@
 import os
+import re
 import json
-import requests
 import datetime
-from pymongo import MongoClient
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from db import get_db
 from dotenv import load_dotenv
-import google.generativeai as genai
-from google.api_core.exceptions import NotFound
+from ollama_client import OllamaPool
+from llm_cache import get_cache
+from gemini_client import get_resolver
+from work_queue import claim_many, release, fail, leased
+from tweet_schema import (
+    TWEETS_PER_TOPIC, MAX_TWEET_CHARS, MAX_HASHTAGS, VARIANT_TYPES,
+    TWEET_SCHEMA, BATCH_SCHEMA, validate
+)
+import metrics
 
 # Load Env
 load_dotenv()
@@ -13,121 +22,357 @@ load_dotenv()
 # ==========================================
 # ⚙️ CONFIGURATION
 # ==========================================
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = "autox_india"
 OLLAMA_URL = os.getenv("OLLAMA_URL", "").strip().rstrip("/") # Removes trailing slashes
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+# Several Colab/ngrok instances: OLLAMA_URLS=https://a.ngrok.app,https://b.ngrok.app
+OLLAMA_URLS = [u.strip().rstrip("/") for u in os.getenv("OLLAMA_URLS", OLLAMA_URL).split(",") if u.strip()]
+OLLAMA_HEDGE = os.getenv("OLLAMA_HEDGE", "1") == "1"
 
-genai.configure(api_key=GEMINI_API_KEY)
+# Separate limits per backend so drafting one topic overlaps with refining another
+OLLAMA_CONCURRENCY = int(os.getenv("OLLAMA_CONCURRENCY", str(2 * max(1, len(OLLAMA_URLS)))))
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "4"))
+OLLAMA_SLOTS = threading.BoundedSemaphore(OLLAMA_CONCURRENCY)
+GEMINI_SLOTS = threading.BoundedSemaphore(GEMINI_CONCURRENCY)
+
+# "structured": Ollama answers in the final JSON shape and Gemini only repairs
+# documents that fail validation. "refine": free-text draft, then Gemini refine.
+GENERATION_MODE = os.getenv("GENERATION_MODE", "structured").strip().lower()
+
+VARIANT_RULES = (
+    f"One tweet per type ({', '.join(VARIANT_TYPES)}), each with 1-{MAX_HASHTAGS} hashtags "
+    f"and at most {MAX_TWEET_CHARS} characters including the hashtags."
+)
+
+# Topics drafted per Ollama request (1 = one prompt per topic).
+# Every topic adds ~TWEETS_PER_TOPIC tweets of output, so keep
+# DRAFT_BATCH_SIZE * ~250 tokens well inside the model's context window.
+DRAFT_BATCH_SIZE = max(1, int(os.getenv("DRAFT_BATCH_SIZE", "4")))
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "0"))  # 0 = model default
+
+# Topics one generator process leases per round (enough to keep every backend busy)
+PENDING_TOPICS = {"status": "approved_for_ai"}
+GENERATOR_CLAIM_BATCH = int(os.getenv("GENERATOR_CLAIM_BATCH", str(DRAFT_BATCH_SIZE * OLLAMA_CONCURRENCY)))
+
+# One pooled keep-alive client per backend, shared by every Ollama call (sized for the worker pool)
+OLLAMA = OllamaPool(OLLAMA_URLS, pool_size=max(OLLAMA_CONCURRENCY, 2), hedge=OLLAMA_HEDGE)
 
 # ==========================================
 # 🔍 AUTO-DETECT MODEL NAME
 # ==========================================
 def get_available_model():
-    """Checks Colab to see which model is actually installed."""
-    headers = {"ngrok-skip-browser-warning": "69420"}
-    try:
-        response = requests.get(f"{OLLAMA_URL}/api/tags", headers=headers, timeout=10)
-        if response.status_code == 200:
-            models = response.json().get('models', [])
-            if models:
-                # Return the first available model name (e.g., 'llama3:latest')
-                return models[0]['name']
-    except Exception as e:
-        print(f"     ⚠️ Could not detect model: {e}")
-    return "llama3:latest" # Fallback
-
-# Detect model once at startup
-OLLAMA_MODEL = get_available_model()
-print(f"🤖 Using Ollama Model: {OLLAMA_MODEL}")
+    """Checks Colab to see which model is actually installed (only once per process)."""
+    if OLLAMA.model is None:
+        OLLAMA.detect_model()
+        print(f"🤖 Using Ollama Model: {OLLAMA.model}")
+    return OLLAMA.model
 
 # ==========================================
 # 🧠 API HANDLERS (OLLAMA & GEMINI)
 # ==========================================
 
-def call_remote_ollama(prompt):
-    try:
-        headers = {
-            "ngrok-skip-browser-warning": "69420", 
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "model": OLLAMA_MODEL,
-            "prompt": prompt,
-            "stream": False
-        }
-        
-        response = requests.post(
-            f"{OLLAMA_URL}/api/generate", 
-            json=payload, 
-            headers=headers,
-            timeout=120
+NUMBERED_ITEM = re.compile(r"^\s*(?:\*\*)?(?:tweet\s*)?(\d{1,2})[.):]", re.IGNORECASE | re.MULTILINE)
+
+def enough_tweets(text):
+    """True once the model starts an item past TWEETS_PER_TOPIC (the first ones are complete)."""
+    return any(int(n) > TWEETS_PER_TOPIC for n in NUMBERED_ITEM.findall(text))
+
+def call_remote_ollama(prompt, stop_when=enough_tweets):
+    def draft():
+        try:
+            # Streamed, so extra chatter after the last tweet is cut off early
+            with metrics.span("call_remote_ollama"), metrics.llm_call("ollama", OLLAMA.model, prompt) as call:
+                call["response"] = OLLAMA.generate_until(prompt, stop_when=stop_when) or None
+            return call["response"]
+        except Exception as e:
+            print(f"     ❌ Connection Failed: {e}")
+            return None
+
+    settings = {"stop_when": getattr(stop_when, "__name__", None)}
+    return get_cache().get_or_call("ollama", OLLAMA.model, prompt, settings, draft)
+
+def is_valid(doc):
+    # Only answers that pass validation are cached; a bad one must be asked for again on retry
+    return not validate(doc)[1]
+
+def call_ollama_structured(topic_title):
+    """Schema-constrained draft: Ollama answers directly in the final_tweets shape."""
+    prompt = (
+        f"Write {TWEETS_PER_TOPIC} Hinglish nationalist tweets for: {topic_title}\n"
+        f"{VARIANT_RULES} Reply as JSON."
+    )
+
+    def draft():
+        try:
+            with metrics.span("call_ollama_structured"), metrics.llm_call("ollama", OLLAMA.model, prompt) as call:
+                call["response"] = json.loads(OLLAMA.generate(prompt, format=TWEET_SCHEMA))
+            return call["response"]
+        except Exception as e:
+            print(f"     ❌ Structured Draft Failed: {e}")
+            return None
+
+    return get_cache().get_or_call("ollama", OLLAMA.model, prompt, {"format": TWEET_SCHEMA}, draft, keep=is_valid)
+
+def batch_prompt(topics):
+    listed = json.dumps([{"id": i, "topic": t["title"]} for i, t in enumerate(topics)], ensure_ascii=False)
+    if GENERATION_MODE == "structured":
+        return (
+            f"Write {TWEETS_PER_TOPIC} Hinglish nationalist tweets for EACH topic below. {VARIANT_RULES}\n"
+            'Reply as JSON: {"drafts": [{"id": <id>, "tweet_variants": [{"type": "<type>", "tweet": "<tweet>", "hashtags": ["#<tag>"]}]}]}\n'
+            f"Topics: {listed}"
         )
-        
-        if response.status_code == 200:
-            return response.json().get("response", "")
-        else:
-            print(f"     ❌ Ollama Error: {response.status_code} (Check if model name matches)")
+    return (
+        f"Write {TWEETS_PER_TOPIC} Hinglish nationalist tweets for EACH topic below.\n"
+        'Reply as JSON: {"drafts": [{"id": <id>, "tweets": ["<tweet>", ...]}]}\n'
+        f"Topics: {listed}"
+    )
+
+def parse_batch_drafts(text, count):
+    """{id: draft} for every topic the model answered properly (text, or a tweet_variants doc when structured)."""
+    try:
+        items = json.loads(text).get("drafts", [])
+    except (ValueError, AttributeError):
+        return {}
+
+    drafts = {}
+    for item in items if isinstance(items, list) else []:
+        try:
+            idx = int(item.get("id"))
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if not 0 <= idx < count:
+            continue
+
+        if GENERATION_MODE == "structured":
+            # Checked per topic later; an invalid one is repaired, not re-drafted
+            if isinstance(item.get("tweet_variants"), list) and item["tweet_variants"]:
+                drafts[idx] = {"tweet_variants": item["tweet_variants"]}
+            continue
+
+        tweets = item.get("tweets")
+        if not isinstance(tweets, list):
+            continue
+        tweets = [str(t).strip() for t in tweets if str(t).strip()][:TWEETS_PER_TOPIC]
+        if tweets:
+            # Same shape as a single-topic draft, so the refiner sees no difference
+            drafts[idx] = "\n".join(f"{n}. {t}" for n, t in enumerate(tweets, 1))
+    return drafts
+
+def call_ollama_batch(topics):
+    prompt = batch_prompt(topics)
+    options = {"num_ctx": OLLAMA_NUM_CTX} if OLLAMA_NUM_CTX else None
+    response_format = BATCH_SCHEMA if GENERATION_MODE == "structured" else "json"
+
+    def draft():
+        try:
+            with metrics.span("call_ollama_batch", topics=len(topics)), metrics.llm_call("ollama", OLLAMA.model, prompt) as call:
+                call["response"] = OLLAMA.generate(prompt, options=options, format=response_format) or None
+            return call["response"]
+        except Exception as e:
+            print(f"     ❌ Batch Draft Failed: {e}")
             return None
-    except Exception as e:
-        print(f"     ❌ Connection Failed: {e}")
-        return None
+
+    settings = {"format": response_format, "options": options}
+    return get_cache().get_or_call("ollama", OLLAMA.model, prompt, settings, draft)
+
+def draft_batch(topics):
+    """
+    One Ollama request for several topics.
+    Returns [(topic, draft or None)]; None sends that topic back to its own prompt.
+    """
+    with OLLAMA_SLOTS:
+        text = call_ollama_batch(topics)
+
+    drafts = parse_batch_drafts(text, len(topics)) if text else {}
+    missing = len(topics) - len(drafts)
+    if missing:
+        print(f"   ⚠️ Batch draft: {missing}/{len(topics)} topics unparsed, drafting them one by one")
+    return [(topic, drafts.get(i)) for i, topic in enumerate(topics)]
+
+def call_gemini_json(prompt, what, topic_title, keep=None):
+    generation_config = {"response_mime_type": "application/json"}
+    gemini = get_resolver()
+
+    def answer():
+        # Resolver picks a working model and skips ones that keep failing
+        try:
+            with metrics.span(f"call_gemini_{what}", topic=topic_title):
+                return json.loads(gemini.generate(prompt, generation_config))
+        except Exception as e:
+            print(f"     ❌ Gemini {what.title()} Failed: {e}")
+            return None
+
+    return get_cache().get_or_call("gemini", "/".join(gemini.models), prompt, generation_config, answer, keep=keep)
 
 def call_gemini_refiner(raw_text, topic_title):
     # Prompt for refining
     prompt = f"Refine these Hinglish tweet drafts for '{topic_title}' into strict JSON. Raw Text: {raw_text}"
-    
-    # Try multiple models to avoid 404
-    for model_name in ['gemini-1.5-flash', 'gemini-1.5-flash-001', 'gemini-pro']:
-        try:
-            model = genai.GenerativeModel(model_name)
-            response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-            return json.loads(response.text)
-        except:
-            continue
-    return None
+    return call_gemini_json(prompt, "refiner", topic_title)
+
+def call_gemini_repair(doc, topic_title, problems):
+    prompt = (
+        f"Repair these Hinglish tweets for '{topic_title}' and return strict JSON "
+        '{"tweet_variants": [{"type": "<type>", "tweet": "<tweet>", "hashtags": ["#<tag>"]}]}. '
+        f"{VARIANT_RULES} Problems: {'; '.join(problems)}. "
+        f"Document: {json.dumps(doc, ensure_ascii=False, default=str)}"
+    )
+    return call_gemini_json(prompt, "repair", topic_title, keep=is_valid)
 
 # ==========================================
 # 🚀 GENERATION LOGIC
 # ==========================================
 
-def generate_engine():
-    print(f"--- ⚡ Step 3: Generator Started (Model: {OLLAMA_MODEL}) ---")
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
-    
-    # Process topics approved in Step 2
-    pending = list(db.top_topics.find({"status": "approved_for_ai"}))
-    
-    if not pending:
-        print("   💤 No new topics found.")
-        return
+def refined_tweets(topic, draft=None):
+    """Free-text Ollama draft, turned into tweet_variants JSON by Gemini."""
+    label = topic['title'][:50]
+
+    # 1. Ollama Draft
+    raw_drafts = draft
+    if not raw_drafts:
+        with OLLAMA_SLOTS:
+            raw_drafts = call_remote_ollama(f"Write {TWEETS_PER_TOPIC} Hinglish nationalist tweets for: {topic['title']}")
+
+    if not raw_drafts:
+        print(f"      ❌ Draft failed: {label}...")
+        return None
+
+    # 2. Gemini Refine
+    with GEMINI_SLOTS:
+        final_json = call_gemini_refiner(raw_drafts, topic['title'])
+
+    if not final_json:
+        print(f"      ❌ Refinement failed: {label}...")
+        return None
+    return final_json
+
+def structured_tweets(topic, draft=None):
+    """Schema-constrained Ollama JSON, validated locally; Gemini only repairs what fails."""
+    label = topic['title'][:50]
+
+    # 1. Ollama Draft (already tweet_variants JSON)
+    doc = draft
+    if not doc:
+        with OLLAMA_SLOTS:
+            doc = call_ollama_structured(topic['title'])
+
+    if not doc:
+        print(f"      ❌ Draft failed: {label}...")
+        return None
+
+    # 2. Local validation
+    doc, problems = validate(doc)
+    if not problems:
+        metrics.GENERATION_VALIDATION.labels(result="valid").inc()
+        return doc
+
+    # 3. Gemini Repair (only for documents that broke a rule)
+    print(f"      🩹 Repairing {label}...: {'; '.join(problems)[:100]}")
+    with GEMINI_SLOTS:
+        repaired = call_gemini_repair(doc, topic['title'], problems)
+
+    repaired, problems = validate(repaired) if repaired else (None, ["no answer"])
+    if problems:
+        metrics.GENERATION_VALIDATION.labels(result="failed").inc()
+        print(f"      ❌ Repair failed: {label}... ({'; '.join(problems)[:100]})")
+        return None
+    metrics.GENERATION_VALIDATION.labels(result="repaired").inc()
+    return repaired
+
+def generate_topic(db, topic, draft=None):
+    """
+    Draft -> validate/refine -> save, for a single (claimed) topic.
+    draft: output already produced by a batched request (skips the Ollama call).
+    Returns True when the topic has its final_tweets document.
+    """
+    label = topic['title'][:50]
+
+    # A worker that died after saving leaves the output behind: just finish the topic
+    if db.final_tweets.find_one({"topic_id": topic['_id']}, {"_id": 1}):
+        release(db.top_topics, topic['_id'], {"$set": {"status": "completed"}})
+        print(f"      ♻️ Already generated: {label}...")
+        return True
+
+    if GENERATION_MODE == "structured":
+        final_json = structured_tweets(topic, draft)
+    else:
+        final_json = refined_tweets(topic, draft)
+
+    if not final_json:
+        fail(db.top_topics, topic['_id'])
+        return False
+
+    # Save (upsert on topic_id: two workers racing on one topic still leave a single document)
+    db.final_tweets.update_one(
+        {"topic_id": topic['_id']},
+        {"$setOnInsert": {
+            "topic_id": topic['_id'],
+            "topic": topic['title'],
+            "source": topic.get('source_link', ''),
+            "tweet_variants": final_json.get('tweet_variants', []),
+            "status": "ready_for_posting",
+            "generated_at": datetime.datetime.now()
+        }},
+        upsert=True
+    )
+    release(db.top_topics, topic['_id'], {"$set": {"status": "completed"}})
+    print(f"      ✅ Success: {label}...")
+    return True
 
+def generate_claimed(db, pending):
+    """Runs one round of claimed topics through the worker pool. Returns how many finished."""
     for topic in pending:
         print(f"\n📍 Topic: {topic['title'][:50]}...")
-        
-        # 1. Ollama Draft
-        raw_drafts = call_remote_ollama(f"Write 3 Hinglish nationalist tweets for: {topic['title']}")
-        
-        if not raw_drafts:
-            continue
-            
-        # 2. Gemini Refine
-        final_json = call_gemini_refiner(raw_drafts, topic['title'])
-        
-        if final_json:
-            # 3. Save
-            db.final_tweets.insert_one({
-                "topic": topic['title'],
-                "source": topic.get('source_link', ''),
-                "tweet_variants": final_json.get('tweet_variants', []),
-                "status": "ready_for_posting",
-                "generated_at": datetime.datetime.now()
-            })
-            db.top_topics.update_one({"_id": topic['_id']}, {"$set": {"status": "completed"}})
-            print("      ✅ Success!")
+
+    # Each worker blocks on the backend semaphores, so the pool only needs
+    # enough threads to keep both backends busy at the same time
+    workers = max(1, min(len(pending), OLLAMA_CONCURRENCY + GEMINI_CONCURRENCY))
+    done = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        if DRAFT_BATCH_SIZE > 1 and len(pending) > 1:
+            # Draft several topics per request; each topic is refined as soon as its batch is back
+            batches = [pending[i:i + DRAFT_BATCH_SIZE] for i in range(0, len(pending), DRAFT_BATCH_SIZE)]
+            futures = {}
+            for batch in as_completed([pool.submit(draft_batch, b) for b in batches]):
+                for topic, draft in batch.result():
+                    futures[pool.submit(generate_topic, db, topic, draft)] = topic
         else:
-            print("      ❌ Refinement failed.")
+            futures = {pool.submit(generate_topic, db, topic): topic for topic in pending}
+
+        for future in as_completed(futures):
+            try:
+                if future.result():
+                    done += 1
+            except Exception as e:
+                # One broken topic must not stall the rest of the batch
+                print(f"      ❌ Error on '{futures[future]['title'][:50]}': {e}")
+                fail(db.top_topics, futures[future]['_id'])
+    return done
+
+def generate_engine(db=None):
+    # Detect model on first run, not at import (keeps in-process pipelines cheap)
+    model_name = get_available_model()
+    print(f"--- ⚡ Step 3: Generator Started (Model: {model_name}, Mode: {GENERATION_MODE}) ---")
+    if db is None:
+        db = get_db()
+    
+    # Claim topics approved in Step 2 a round at a time, so other
+    # generator processes (here or on other machines) share the queue
+    claimed = done = 0
+    while True:
+        pending = claim_many(db.top_topics, PENDING_TOPICS, GENERATOR_CLAIM_BATCH)
+        if not pending:
+            break
+        claimed += len(pending)
+        with leased(db.top_topics, [t['_id'] for t in pending]):
+            done += generate_claimed(db, pending)
+
+    if not claimed:
+        print("   💤 No new topics found.")
+        return
+
+    metrics.STAGE_ITEMS.labels(stage="generator").inc(done)
+    print(f"\n--- 🏁 Generated {done}/{claimed} topics. ---")
+    print(f"   💾 LLM Cache: {get_cache().stats()}")
+    print(f"   🔁 Gemini: {get_resolver().stats()}")
+    print(f"   🔀 Ollama: {OLLAMA.stats()}")
 
 if __name__ == "__main__":
     generate_engine()
\ No newline at end of file
@@ -0,0 +1,158 @@
+import json
+import argparse
+import datetime
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from db import get_db
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+WINDOW_HOURS = 24
+
+# What each stage still has to do (all index-backed)
+BACKLOG_QUERIES = {
+    "generation": ("top_topics", {"status": "approved_for_ai"}),
+    "enhancement": ("final_tweets", {"status": "ready_for_posting", "enhanced": {"$ne": True}, "enhance_status": {"$ne": "dead_letter"}}),
+    "review": ("final_tweets", {"status": "ready_for_posting"})
+}
+
+# collection -> (stage that writes it, time field, index-backed "recent" filter)
+COLLECTIONS = {
+    "raw_topics": ("sentinel", "updated_at", lambda since: {"updated_at": {"$gte": since}}),
+    "top_topics": ("processor", "created_at", lambda since: {"date": {"$gte": since.date().isoformat()}}),
+    # _id carries the insert time, so the primary index bounds the window
+    "final_tweets": ("generator", "generated_at", lambda since: {
+        "_id": {"$gte": ObjectId.from_datetime(since.astimezone(datetime.timezone.utc))}
+    })
+}
+
+# ==========================================
+# 🩺 HEALTH REPORT (ONE AGGREGATION + METADATA COUNTS)
+# ==========================================
+
+def tagged_pipeline(collection, since):
+    """
+    Recent documents plus everything still pending, tagged with their collection.
+    The $match only uses indexed fields, so it never scans the whole collection.
+    """
+    _, time_field, recent = COLLECTIONS[collection]
+    pending = [query for coll, query in BACKLOG_QUERIES.values() if coll == collection]
+    return [
+        {"$match": {"$or": [recent(since)] + pending}},
+        {"$project": {"_id": 0, "c": {"$literal": collection}, "status": 1, "enhanced": 1, "t": f"${time_field}"}}
+    ]
+
+def facets(since):
+    stages = {}
+    for stage, (collection, query) in BACKLOG_QUERIES.items():
+        stages[f"backlog.{stage}"] = [
+            {"$match": dict(query, c=collection)},
+            {"$group": {"_id": None, "count": {"$sum": 1}, "oldest": {"$min": "$t"}}}
+        ]
+    for collection in COLLECTIONS:
+        recent = {"$match": {"c": collection, "t": {"$gte": since}}}
+        stages[f"status.{collection}"] = [recent, {"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        stages[f"hourly.{collection}"] = [
+            recent,
+            {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d %H:00", "date": "$t"}}, "count": {"$sum": 1}}},
+            {"$sort": {"_id": 1}}
+        ]
+    # $facet output names can't contain dots
+    return {name.replace(".", "__"): pipeline for name, pipeline in stages.items()}
+
+def health_report(db=None, window_hours=WINDOW_HOURS):
+    """
+    Per-stage backlog (count + oldest pending age), status breakdown and hourly
+    throughput over the last window_hours, from a single $facet aggregation.
+    Collection totals cost one more round trip each (estimated_document_count reads
+    collection metadata, no scan), so a report is 1 + len(COLLECTIONS) round trips.
+    """
+    if db is None:
+        db = get_db()
+    now = datetime.datetime.now()
+    since = now - datetime.timedelta(hours=window_hours)
+
+    first, *others = COLLECTIONS
+    pipeline = tagged_pipeline(first, since)
+    for collection in others:
+        pipeline.append({"$unionWith": {"coll": collection, "pipeline": tagged_pipeline(collection, since)}})
+    pipeline.append({"$facet": facets(since)})
+    result = next(db[first].aggregate(pipeline, allowDiskUse=True), {})
+    result = {name.replace("__", "."): rows for name, rows in result.items()}
+
+    report = {
+        "generated_at": now.isoformat(timespec="seconds"),
+        "window_hours": window_hours,
+        "totals": {},
+        "backlog": {},
+        "status": {},
+        "hourly": {}
+    }
+    for collection, (stage, _, _) in COLLECTIONS.items():
+        try:
+            report["totals"][collection] = db[collection].estimated_document_count()
+        except PyMongoError:
+            report["totals"][collection] = None
+        report["status"][collection] = {
+            str(row["_id"]): row["count"] for row in result.get(f"status.{collection}", []) if row["_id"] is not None
+        }
+        report["hourly"][stage] = [[row["_id"], row["count"]] for row in result.get(f"hourly.{collection}", [])]
+
+    for stage in BACKLOG_QUERIES:
+        rows = result.get(f"backlog.{stage}") or [{"count": 0, "oldest": None}]
+        oldest = rows[0]["oldest"]
+        report["backlog"][stage] = {
+            "count": rows[0]["count"],
+            "oldest_age_s": round((now - oldest).total_seconds()) if isinstance(oldest, datetime.datetime) else None
+        }
+    return report
+
+# ==========================================
+# 🖨️ COMMAND LINE
+# ==========================================
+
+def format_age(seconds):
+    if seconds is None:
+        return "-"
+    if seconds < 3600:
+        return f"{seconds // 60}m"
+    return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+
+def print_report(report):
+    print("📊 PIPELINE HEALTH")
+    print("-----------------------")
+    for collection, total in report["totals"].items():
+        statuses = ", ".join(f"{k}: {v}" for k, v in report["status"][collection].items())
+        print(f"{collection:<14}~{total if total is not None else '?':>8} items   {statuses}")
+    print("-----------------------")
+    for stage, backlog in report["backlog"].items():
+        print(f"⏳ {stage:<12}{backlog['count']:>6} pending   oldest {format_age(backlog['oldest_age_s'])}")
+    print("-----------------------")
+    print(f"📈 Last {report['window_hours']}h per hour:")
+    for stage, rows in report["hourly"].items():
+        counts = " ".join(str(count) for _, count in rows[-12:]) or "-"
+        print(f"   {stage:<10}{sum(c for _, c in rows):>6} total   {counts}")
+
+    ready = report["backlog"]["review"]["count"]
+    if ready == 0:
+        print("\n❌ PROBLEM: No tweets are ready.")
+        print("👉 SOLUTION: Run 'python generator.py' (is OLLAMA_URL reachable?).")
+    else:
+        print(f"\n✅ SUCCESS: {ready} tweets are waiting. Check http://127.0.0.1:8000 again.")
+
+def main():
+    parser = argparse.ArgumentParser(description="AutoX India pipeline health report")
+    parser.add_argument("--json", action="store_true", help="machine-readable output for monitoring")
+    parser.add_argument("--hours", type=int, default=WINDOW_HOURS, help="throughput window")
+    args = parser.parse_args()
+
+    report = health_report(window_hours=args.hours)
+    if args.json:
+        print(json.dumps(report, default=str))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import re
+
+# ==========================================
+# 🏷️ KEYWORD TAXONOMY (shared by Step 1 & Step 2)
+# ==========================================
+
+TAGS = {
+    "Hindu / Culture": ["ram", "mandir", "diwali", "sanatan", "temple", "ayodhya", "culture", "dharma"],
+    "Indian Politics": ["modi", "bjp", "congress", "parliament", "election", "government", "cabinet"],
+    "Global / India": ["pakistan", "china", "usa", "ukraine", "israel", "russia", "geopolitics"],
+    "Humanity / Social": ["help", "rescue", "donation", "relief", "save", "crisis"]
+}
+
+# 🚫 Blocklist: Topics to auto-reject (add more as needed)
+BLOCKWORDS = [
+    "celebrity gossip", "movie review", "trailer", "box office",
+    "sports score", "cricket match result", "big boss", "reality show",
+    "dating", "fashion", "horoscope"
+]
+
+# Category Score (0–45): group -> (points, words looked for in the category string)
+CATEGORY_SCORES = {
+    "politics": (20, ["politics"]),
+    "hindu_culture": (15, ["hindu", "culture"]),
+    "global": (10, ["global"]),
+    "humanity_social": (10, ["humanity", "social"])
+}
+
+DEFAULT_CATEGORY = "General News"
+
+# Endings a keyword may carry and still count ("trailer" -> "trailers", "save" -> "saved")
+INFLECTION = r"(?:s|es|d|ed)?"
+
+# ==========================================
+# ⚙️ COMPILED MATCHER
+# ==========================================
+
+def _trie_pattern(node):
+    """Turns a character trie into a regex so shared prefixes are tested only once."""
+    end = "" in node
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch]
+
+    if not branches:
+        return ""
+    if len(branches) == 1 and not end:
+        return branches[0]
+
+    body = "(?:" + "|".join(branches) + ")"
+    return body + "?" if end else body
+
+def build_pattern(keywords):
+    trie = {}
+    for word in keywords:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = True
+    # Word start, then the keyword (group 1) and an optional inflection, so "trailers",
+    # "movie reviews" and "elections" still hit but "program" no longer means "ram".
+    # The lookarounds also work for keywords starting/ending with symbols (#tags).
+    return re.compile(r"(?<!\w)(" + _trie_pattern(trie) + r")" + INFLECTION + r"(?!\w)", re.IGNORECASE)
+
+class KeywordMatcher:
+    """
+    One precompiled pattern for many labelled keyword groups.
+    match(text) -> {label: [keywords found]} in a single scan of the text.
+    """
+    def __init__(self, groups):
+        self.labels_for = {}
+        for label, words in groups:
+            for word in words:
+                self.labels_for.setdefault(word.lower(), []).append(label)
+
+        self.pattern = build_pattern(self.labels_for) if self.labels_for else None
+
+    def match(self, text):
+        hits = {}
+        if not text or self.pattern is None:
+            return hits
+        for m in self.pattern.finditer(text):
+            word = m.group(1).lower()
+            for label in self.labels_for[word]:
+                found = hits.setdefault(label, [])
+                if word not in found:
+                    found.append(word)
+        return hits
+
+# Built once at import: every tag keyword and blockword in one pattern
+TITLE_MATCHER = KeywordMatcher(
+    [(("tag", name), words) for name, words in TAGS.items()] +
+    [(("block", word), [word]) for word in BLOCKWORDS]
+)
+
+CATEGORY_MATCHER = KeywordMatcher(
+    [(group, words) for group, (_, words) in CATEGORY_SCORES.items()]
+)
+
+def score_category(category_str):
+    hits = CATEGORY_MATCHER.match(category_str or "")
+    return sum(CATEGORY_SCORES[group][0] for group in hits)
+
+def scan_title(title):
+    """
+    All keyword hits for a title in one pass.
+    Returns {"tags": [...], "blocked": [...], "category": "...", "score": int}
+    """
+    hits = TITLE_MATCHER.match(title)
+    tags = [name for name in TAGS if ("tag", name) in hits]
+    blocked = [label[1] for label in hits if label[0] == "block"]
+    category = " / ".join(tags) if tags else DEFAULT_CATEGORY
+
+    return {
+        "tags": tags,
+        "blocked": blocked,
+        "category": category,
+        "score": score_category(category)
+    }
+
+
+# Titles that must keep matching (plurals/inflections of keywords and blockwords)
+SELF_CHECKS = [
+    ("Movie reviews this week", {"blocked": ["movie review"]}),
+    ("Trailers out", {"blocked": ["trailer"]}),
+    ("Lok Sabha elections 2026 results", {"category": "Indian Politics", "score": 20}),
+    ("Temples reopen in Ayodhya", {"category": "Hindu / Culture", "score": 15}),
+    ("Rescued workers thank NDRF", {"tags": ["Humanity / Social"]}),
+    ("New program for drama schools", {"category": DEFAULT_CATEGORY, "blocked": []}),
+]
+
+if __name__ == "__main__":
+    print("--- 🏷️ Checking keyword matcher ---")
+    failures = 0
+    for title, expected in SELF_CHECKS:
+        result = scan_title(title)
+        wrong = {k: result[k] for k, v in expected.items() if result[k] != v}
+        if wrong:
+            failures += 1
+            print(f"   ❌ {title!r}: expected {expected}, got {wrong}")
+    print("--- ✅ All keyword checks passed. ---" if not failures else f"--- ❌ {failures} check(s) failed. ---")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from dotenv import load_dotenv
+import metrics
+
+load_dotenv()
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.sqlite"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))    # seconds
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_DISABLED = os.getenv("LLM_CACHE_DISABLED", "0") == "1"
+
+# ==========================================
+# 💾 CONTENT-ADDRESSED LLM RESPONSE CACHE
+# ==========================================
+
+def cache_key(backend, model, prompt, settings=None):
+    """sha256 over everything that changes the answer."""
+    raw = json.dumps([backend, model, prompt, settings or {}], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class LLMCache:
+    """
+    SQLite-backed cache of LLM answers.
+    Entries expire after `ttl` seconds; past `max_entries` the least recently used are dropped.
+    """
+    def __init__(self, path=LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY, backend TEXT, model TEXT, value TEXT,"
+            " created_at REAL, accessed_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+        self.conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self.conn.commit()
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key, value, backend="", model=""):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, backend, model, value, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, backend, model, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        count = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                " SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def get_or_call(self, backend, model, prompt, settings, fn, keep=None):
+        """
+        Returns the cached answer, or calls fn() and stores its result.
+        None results (failed calls) are never cached, so they are retried next time.
+        keep(value) -> False also skips the cache (and ignores such an entry if one is stored),
+        e.g. for answers that fail validation.
+        """
+        if LLM_CACHE_DISABLED:
+            return fn()
+
+        key = cache_key(backend, model, prompt, settings)
+        cached = self.get(key)
+        if cached is not None and keep is not None and not keep(cached):
+            cached = None
+        metrics.LLM_CACHE.labels(backend=backend, result="hit" if cached is not None else "miss").inc()
+        if cached is not None:
+            return cached
+
+        value = fn()
+        if value is not None and (keep is None or keep(value)):
+            self.put(key, value, backend, model)
+        return value
+
+    def stats(self):
+        with self.lock:
+            size = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "entries": size
+        }
+
+_CACHE = {"instance": None}
+_CACHE_LOCK = threading.Lock()
+
+def get_cache():
+    """Process-wide cache shared by generator.py and enhancer.py."""
+    with _CACHE_LOCK:
+        if _CACHE["instance"] is None:
+            _CACHE["instance"] = LLMCache()
+        return _CACHE["instance"]
@@ -1,21 +1,29 @@
 import time
+import argparse
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from colorama import Fore, Style, init
+from dotenv import load_dotenv
 
 init(autoreset=True)
+load_dotenv()
+
+# ==========================================
+# 🐢 SUBPROCESS MODE (one interpreter per step)
+# ==========================================
 
 def run_step(script_name, step_name):
     print(f"\n{Fore.CYAN}{'='*60}")
     print(f"{Fore.YELLOW}🚀 STARTING STEP: {step_name} ({script_name})")
     print(f"{Fore.CYAN}{'='*60}")
-    
+
     start_time = time.time()
-    
+
     # Run the script and wait for it to finish
     try:
         result = subprocess.run([sys.executable, script_name], check=True)
-        
+
         duration = time.time() - start_time
         print(f"\n{Fore.GREEN}✅ {step_name} COMPLETED in {duration:.2f}s")
         return True
@@ -26,41 +34,160 @@ def run_step(script_name, step_name):
         print(f"\n{Fore.RED}❌ ERROR: File '{script_name}' not found.")
         return False
 
+def run_subprocess_pipeline():
+    steps = [
+        ("sentinel.py", "Step 1: Data Collection"),
+        ("processor.py", "Step 2: Scoring & Filtering"),
+        ("generator.py", "Step 3: AI Generation"),
+        ("enhancer.py", "Step 4: Intelligence Enhancement")
+    ]
+    for number, (script_name, step_name) in enumerate(steps, start=1):
+        if not run_step(script_name, step_name):
+            print(f"{Fore.RED}Stopping due to error in Step {number}.")
+            return False
+    return True
+
+# ==========================================
+# ⚡ IN-PROCESS MODE (DAG of callables)
+# ==========================================
+# Modules are imported inside the stages so subprocess mode never loads them.
+
+def stage_news(db):
+    import sentinel
+    sentinel.fetch_news_topics(db.raw_topics)
+
+def stage_trends(db):
+    import sentinel
+    sentinel.fetch_x_trends(db.raw_topics)
+
+def stage_processor(db):
+    import processor
+    processor.process_topics(db)
+
+def stage_generator(db):
+    import generator
+    generator.generate_engine(db)
+
+def stage_enhancer(db):
+    import enhancer
+    enhancer.run_enhancer(db)
+
+# name -> (label, callable, dependencies)
+PIPELINE = {
+    "news": ("Step 1a: RSS News", stage_news, []),
+    "trends": ("Step 1b: X Trends", stage_trends, []),
+    "processor": ("Step 2: Scoring & Filtering", stage_processor, ["news", "trends"]),
+    "generator": ("Step 3: AI Generation", stage_generator, ["processor"]),
+    "enhancer": ("Step 4: Intelligence Enhancement", stage_enhancer, ["generator"])
+}
+
+def timed(label, fn, db):
+    import metrics
+    print(f"\n{Fore.YELLOW}🚀 STARTING STAGE: {label}")
+    start_time = time.time()
+    with metrics.span(f"stage.{fn.__name__}"):
+        fn(db)
+    duration = time.time() - start_time
+    metrics.STAGE_SECONDS.labels(stage=fn.__name__.replace("stage_", "")).observe(duration)
+    return duration
+
+def run_dag(stages, db, max_workers=4):
+    """
+    Runs every stage as soon as all of its dependencies succeeded.
+    Independent stages (RSS + trends) run in parallel.
+    A failed stage skips everything that depends on it.
+    Returns {name: {"status": ..., "seconds": ...}}.
+    """
+    results = {}
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while len(results) < len(stages):
+            # Launch everything that is ready (or skip it if a dependency failed)
+            for name, (label, fn, deps) in stages.items():
+                if name in results or name in running:
+                    continue
+                if any(results.get(d, {}).get("status") in ("failed", "skipped") for d in deps):
+                    results[name] = {"status": "skipped", "seconds": 0.0}
+                    print(f"{Fore.RED}⏭️ Skipping {label} (dependency failed)")
+                elif all(results.get(d, {}).get("status") == "ok" for d in deps):
+                    running[name] = pool.submit(timed, label, fn, db)
+
+            if not running:
+                break
+
+            done, _ = wait(running.values(), return_when=FIRST_COMPLETED)
+            for name in [n for n, f in running.items() if f in done]:
+                future = running.pop(name)
+                label = stages[name][0]
+                try:
+                    seconds = future.result()
+                    results[name] = {"status": "ok", "seconds": seconds}
+                    print(f"{Fore.GREEN}✅ {label} COMPLETED in {seconds:.2f}s")
+                except Exception as e:
+                    results[name] = {"status": "failed", "seconds": 0.0}
+                    print(f"{Fore.RED}❌ ERROR in {label}: {e}")
+
+    return results
+
+def print_timings(results, total):
+    print(f"\n{Fore.CYAN}{'='*60}")
+    print(f"{Fore.WHITE}⏱️ STAGE TIMINGS")
+    for name, (label, _, _) in PIPELINE.items():
+        r = results.get(name, {"status": "skipped", "seconds": 0.0})
+        color = Fore.GREEN if r["status"] == "ok" else Fore.RED
+        print(f"{color}   {label:<36} {r['status']:<8} {r['seconds']:>7.2f}s")
+    print(f"{Fore.WHITE}   {'Total wall time':<36} {'':<8} {total:>7.2f}s")
+
+def run_inprocess_pipeline():
+    from db import get_db
+
+    # One pooled Mongo client (and one set of LLM clients) for every stage
+    db = get_db()
+
+    start_time = time.time()
+    results = run_dag(PIPELINE, db)
+    print_timings(results, time.time() - start_time)
+
+    return all(r["status"] == "ok" for r in results.values())
+
+# ==========================================
+# 🚀 ENTRY POINT
+# ==========================================
+
 def main():
+    parser = argparse.ArgumentParser(description="AutoX India daily pipeline")
+    parser.add_argument("--subprocess", action="store_true", help="run each step in its own Python process (old mode)")
+    parser.add_argument("--stream", action="store_true", help="keep running and push each topic through the stages as it arrives")
+    parser.add_argument("--no-dashboard", action="store_true", help="exit after Step 4 instead of starting the dashboard")
+    args = parser.parse_args()
+
     print(f"{Fore.WHITE}{Style.BRIGHT}🇮🇳 AUTOX INDIA - DAILY AUTOMATION SEQUENCE 🇮🇳")
-    
-    # --- SEQUENCE ---
-    
-    # Step 1: Sentinel (Scrape)
-    if not run_step("sentinel.py", "Step 1: Data Collection"):
-        print(f"{Fore.RED}Stopping due to error in Step 1.")
-        return
 
-    # Step 2: Processor (Filter)
-    if not run_step("processor.py", "Step 2: Scoring & Filtering"):
-        print(f"{Fore.RED}Stopping due to error in Step 2.")
+    if args.stream:
+        import stream
+        stream.run_stream()
         return
 
-    # Step 3: Generator (AI Writing)
-    if not run_step("generator.py", "Step 3: AI Generation"):
-        print(f"{Fore.RED}Stopping due to error in Step 3.")
+    # --- SEQUENCE ---
+    ok = run_subprocess_pipeline() if args.subprocess else run_inprocess_pipeline()
+    if not ok:
+        print(f"{Fore.RED}Stopping due to pipeline errors.")
         return
 
-    # Step 4: Enhancer (Images & Retweets)
-    if not run_step("enhancer.py", "Step 4: Intelligence Enhancement"):
-        print(f"{Fore.RED}Stopping due to error in Step 4.")
+    if args.no_dashboard:
         return
 
     # Step 5: Dashboard (UI)
     print(f"\n{Fore.CYAN}{'='*60}")
     print(f"{Fore.GREEN}🎉 PIPELINE SUCCESSFUL! STARTING DASHBOARD...")
     print(f"{Fore.CYAN}{'='*60}")
-    
+
     try:
-        # We don't use subprocess.run here because dashboard needs to stay open
+        # Dashboard is a long-running server, so it keeps its own process
         subprocess.run([sys.executable, "dashboard.py"])
     except KeyboardInterrupt:
         print("\n👋 Dashboard closed.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
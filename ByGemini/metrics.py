@@ -0,0 +1,369 @@
+import os
+import json
+import time
+import atexit
+import threading
+import contextlib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+# Every process (pipeline, stream, dashboard) flushes its metrics here,
+# and the dashboard's /metrics merges them all.
+METRICS_DIR = os.getenv("METRICS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".metrics"))
+METRICS_FLUSH_INTERVAL = int(os.getenv("METRICS_FLUSH_INTERVAL", "10"))
+METRICS_TRACING = os.getenv("METRICS_TRACING", "0") == "1"
+# Totals of processes that have exited (see compact())
+AGGREGATE_FILE = "aggregate.json"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536)
+
+# ==========================================
+# 📊 METRIC TYPES (Prometheus text format)
+# ==========================================
+
+_REGISTRY = []
+_LOCK = threading.Lock()
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.series = {}   # label values tuple -> value (or histogram state)
+        _REGISTRY.append(self)
+
+    def labels(self, **labels):
+        return BoundMetric(self, tuple(str(labels.get(n, "")) for n in self.labelnames))
+
+class BoundMetric:
+    def __init__(self, metric, key):
+        self.metric = metric
+        self.key = key
+
+    def inc(self, amount=1):
+        with _LOCK:
+            self.metric.series[self.key] = self.metric.series.get(self.key, 0) + amount
+
+    def set(self, value):
+        with _LOCK:
+            self.metric.series[self.key] = value
+
+    def observe(self, value):
+        m = self.metric
+        with _LOCK:
+            state = m.series.setdefault(self.key, {"buckets": [0] * len(m.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(m.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+class Counter(Metric):
+    kind = "counter"
+
+class Gauge(Metric):
+    kind = "gauge"
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+# ==========================================
+# 📈 PIPELINE METRICS
+# ==========================================
+
+LLM_LATENCY = Histogram("autox_llm_request_seconds", "LLM call latency", ["backend", "model", "outcome"])
+LLM_PROMPT_CHARS = Histogram("autox_llm_prompt_chars", "Prompt size in characters", ["backend"], SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = Histogram("autox_llm_response_chars", "Response size in characters", ["backend"], SIZE_BUCKETS)
+LLM_FALLBACKS = Counter("autox_llm_fallbacks_total", "Calls that had to fall back to another model", ["backend", "model"])
+LLM_RETRIES = Counter("autox_llm_retries_total", "LLM work retried after a failure", ["stage"])
+GENERATION_VALIDATION = Counter("autox_generation_validation_total", "Structured drafts by local validation result", ["result"])
+LLM_HEDGES = Counter("autox_llm_hedges_total", "Hedged Ollama requests (sent, and won by the second backend)", ["outcome"])
+OLLAMA_BACKEND_UP = Gauge("autox_ollama_backend_up", "Last /api/tags health check per Ollama backend", ["backend"])
+LLM_CACHE = Counter("autox_llm_cache_total", "LLM response cache lookups", ["backend", "result"])
+
+MONGO_LATENCY = Histogram("autox_mongo_op_seconds", "MongoDB command latency", ["command", "outcome"])
+
+STAGE_SECONDS = Histogram("autox_stage_seconds", "Wall time per pipeline stage", ["stage"])
+STAGE_ITEMS = Counter("autox_stage_items_total", "Items processed per stage", ["stage"])
+QUEUE_BACKLOG = Gauge("autox_queue_backlog", "Documents waiting in a streaming stage queue", ["stage"])
+
+@contextlib.contextmanager
+def llm_call(backend, model, prompt):
+    """
+    Times one LLM request. Usage:
+        with llm_call("ollama", model, prompt) as call:
+            call["response"] = text
+    """
+    call = {"response": None}
+    LLM_PROMPT_CHARS.labels(backend=backend).observe(len(prompt or ""))
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with span(f"llm.{backend}", model=model, prompt_chars=len(prompt or "")):
+            yield call
+        outcome = "ok" if call["response"] is not None else "empty"
+    finally:
+        LLM_LATENCY.labels(backend=backend, model=model, outcome=outcome).observe(time.perf_counter() - start)
+        if call["response"] is not None:
+            LLM_RESPONSE_CHARS.labels(backend=backend).observe(len(str(call["response"])))
+
+# ==========================================
+# 🔍 OPTIONAL TRACING (OpenTelemetry)
+# ==========================================
+
+_TRACER = {"tracer": None}
+
+def get_tracer():
+    if _TRACER["tracer"] is None and METRICS_TRACING:
+        try:
+            from opentelemetry import trace
+            _TRACER["tracer"] = trace.get_tracer("autox_india")
+        except ImportError:
+            print("   ⚠️ METRICS_TRACING=1 but opentelemetry is not installed.")
+            _TRACER["tracer"] = False
+    return _TRACER["tracer"]
+
+@contextlib.contextmanager
+def span(name, **attributes):
+    """Span around a call when tracing is enabled, no-op otherwise."""
+    tracer = get_tracer() if METRICS_TRACING else None
+    if not tracer:
+        yield None
+        return
+    with tracer.start_as_current_span(name) as current:
+        for key, value in attributes.items():
+            if value is not None:
+                current.set_attribute(key, value)
+        yield current
+
+# ==========================================
+# 🍃 MONGO COMMAND LISTENER
+# ==========================================
+
+try:
+    from pymongo import monitoring
+
+    class MongoMetricsListener(monitoring.CommandListener):
+        """Feeds every driver command's duration into MONGO_LATENCY."""
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            MONGO_LATENCY.labels(command=event.command_name, outcome="ok").observe(event.duration_micros / 1e6)
+
+        def failed(self, event):
+            MONGO_LATENCY.labels(command=event.command_name, outcome="error").observe(event.duration_micros / 1e6)
+except ImportError:
+    MongoMetricsListener = None
+
+# ==========================================
+# 💾 CROSS-PROCESS SNAPSHOTS + EXPOSITION
+# ==========================================
+
+def snapshot():
+    with _LOCK:
+        return {
+            m.name: {
+                "kind": m.kind, "help": m.help, "labelnames": list(m.labelnames),
+                "buckets": list(getattr(m, "buckets", ())),
+                "series": [[list(k), v if not isinstance(v, dict) else dict(v, buckets=list(v["buckets"]))] for k, v in m.series.items()]
+            }
+            for m in _REGISTRY
+        }
+
+def _read_snapshot(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _write_snapshot(path, snap):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(snap, f)
+    os.replace(path + ".tmp", path)
+
+def flush():
+    """Writes this process's metrics to METRICS_DIR/<pid>.json (atomic rename)."""
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write_snapshot(os.path.join(METRICS_DIR, f"{os.getpid()}.json"), snapshot())
+    except OSError as e:
+        print(f"   ⚠️ Could not flush metrics: {e}")
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        flush()
+
+_FLUSHER = {"started": False}
+
+def start_flusher():
+    """Periodic + at-exit flush; called once by any process that records metrics."""
+    if not _FLUSHER["started"]:
+        _FLUSHER["started"] = True
+        threading.Thread(target=_flush_loop, name="metrics-flush", daemon=True).start()
+        atexit.register(flush)
+
+def merge_snapshots(snapshots):
+    """
+    Counters and histograms add up across processes. A gauge is a current value, so the
+    last snapshot that has it wins (snapshots are passed oldest first).
+    """
+    merged = {}
+    for snap in snapshots:
+        for name, data in snap.items():
+            target = merged.setdefault(name, dict(data, series={}))
+            for key, value in data["series"]:
+                key = tuple(key)
+                if isinstance(value, dict):
+                    state = target["series"].setdefault(key, {"buckets": [0] * len(value["buckets"]), "sum": 0.0, "count": 0})
+                    state["buckets"] = [a + b for a, b in zip(state["buckets"], value["buckets"])]
+                    state["sum"] += value["sum"]
+                    state["count"] += value["count"]
+                elif data["kind"] == "gauge":
+                    target["series"][key] = value
+                else:
+                    target["series"][key] = target["series"].get(key, 0) + value
+    return merged
+
+def pid_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+        return True
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        return True
+
+def compact():
+    """
+    Folds the counters/histograms of exited processes into METRICS_DIR/aggregate.json
+    and deletes their <pid>.json files, so the directory doesn't grow with every run.
+    One process compacts at a time (lock file); the others just skip.
+    """
+    if not os.path.isdir(METRICS_DIR):
+        return
+    dead = [
+        name for name in os.listdir(METRICS_DIR)
+        if name.endswith(".json") and name[:-len(".json")].isdigit() and not pid_alive(name[:-len(".json")])
+    ]
+    if not dead:
+        return
+
+    lock = os.path.join(METRICS_DIR, "compact.lock")
+    try:
+        # A lock left by a crashed compaction is taken over after a minute
+        if time.time() - os.path.getmtime(lock) > 60:
+            os.remove(lock)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL))
+    except FileExistsError:
+        return
+
+    try:
+        aggregate_path = os.path.join(METRICS_DIR, AGGREGATE_FILE)
+        # Gauges are never folded: they only mean something while their process runs
+        snapshots = [{k: v for k, v in (_read_snapshot(aggregate_path) or {}).items() if v["kind"] != "gauge"}]
+        folded = []
+        for name in dead:
+            snap = _read_snapshot(os.path.join(METRICS_DIR, name))
+            if snap is not None:
+                snapshots.append({k: v for k, v in snap.items() if v["kind"] != "gauge"})
+            folded.append(name)
+
+        merged = merge_snapshots(snapshots)
+        _write_snapshot(aggregate_path, {
+            name: dict(data, series=[[list(k), v] for k, v in data["series"].items()])
+            for name, data in merged.items()
+        })
+        # A crash right here counts these files twice, never zero times
+        for name in folded:
+            try:
+                os.remove(os.path.join(METRICS_DIR, name))
+            except OSError:
+                pass
+    except OSError as e:
+        print(f"   ⚠️ Could not compact metrics: {e}")
+    finally:
+        try:
+            os.remove(lock)
+        except OSError:
+            pass
+
+def load_all_snapshots():
+    """
+    Other processes' files (exited ones folded into aggregate.json), oldest flush first,
+    then this process's live values.
+    """
+    compact()
+    snapshots = []
+    own = f"{os.getpid()}.json"
+    if os.path.isdir(METRICS_DIR):
+        for name in os.listdir(METRICS_DIR):
+            if not name.endswith(".json") or name == own:
+                continue
+            path = os.path.join(METRICS_DIR, name)
+            snap = _read_snapshot(path)
+            if snap is None:
+                continue
+            # Counters/histograms of finished runs still count; gauges only from live processes
+            if not pid_alive(name[:-len(".json")]):
+                snap = {k: v for k, v in snap.items() if v["kind"] != "gauge"}
+            try:
+                flushed_at = os.path.getmtime(path)
+            except OSError:
+                flushed_at = 0.0
+            snapshots.append((flushed_at, snap))
+    snapshots.sort(key=lambda item: item[0])
+    return [snap for _, snap in snapshots] + [snapshot()]
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def render(extra_gauges=None):
+    """
+    Prometheus text exposition of every process's metrics.
+    extra_gauges: {name: (help, {labels tuple: value}, labelnames)} computed at scrape time.
+    """
+    lines = []
+    merged = merge_snapshots(load_all_snapshots())
+    for name, data in sorted(merged.items()):
+        lines.append(f"# HELP {name} {data['help']}")
+        lines.append(f"# TYPE {name} {data['kind']}")
+        names = data["labelnames"]
+        for key, value in sorted(data["series"].items()):
+            if data["kind"] == "histogram":
+                for bound, count in zip(data["buckets"], value["buckets"]):
+                    lines.append(f"{name}_bucket{_labels(names, key, [('le', bound)])} {count}")
+                lines.append(f"{name}_bucket{_labels(names, key, [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{name}_sum{_labels(names, key)} {value['sum']}")
+                lines.append(f"{name}_count{_labels(names, key)} {value['count']}")
+            else:
+                lines.append(f"{name}{_labels(names, key)} {value}")
+
+    for name, (help_text, series, names) in (extra_gauges or {}).items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for key, value in series.items():
+            lines.append(f"{name}{_labels(names, key)} {value}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,348 @@
+import os
+import json
+import math
+import time
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+
+# ==========================================
+# 🔌 POOLED OLLAMA CLIENT
+# ==========================================
+
+# Ngrok shows an HTML warning page unless this header is present
+DEFAULT_HEADERS = {
+    "ngrok-skip-browser-warning": "69420",
+    "Content-Type": "application/json"
+}
+
+DEFAULT_MODEL = "llama3:latest"
+
+# Multi-backend pool (OLLAMA_URLS)
+HEALTH_INTERVAL = int(os.getenv("OLLAMA_HEALTH_INTERVAL", "30"))   # seconds between /api/tags checks
+HEDGE_DEFAULT_DELAY = float(os.getenv("OLLAMA_HEDGE_DELAY", "15"))  # until enough latencies are known
+HEDGE_MIN_DELAY = 1.0
+HEDGE_MIN_SAMPLES = 20
+
+class OllamaError(Exception):
+    pass
+
+class OllamaClient:
+    """
+    One keep-alive Session per Ollama server, shared by every caller.
+    generate() waits for the full answer, stream() yields tokens as they arrive.
+    """
+    def __init__(self, base_url, model=None, pool_size=10, timeout=120):
+        self.base_url = (base_url or "").strip().rstrip("/")
+        self.model = model
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers.update(DEFAULT_HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def list_models(self, timeout=10):
+        response = self.session.get(f"{self.base_url}/api/tags", timeout=timeout)
+        if response.status_code != 200:
+            raise OllamaError(f"/api/tags returned {response.status_code}")
+        return [m["name"] for m in response.json().get("models", [])]
+
+    def detect_model(self, fallback=DEFAULT_MODEL):
+        """Picks the first installed model (e.g. 'llama3:latest') and remembers it."""
+        try:
+            models = self.list_models()
+            if models:
+                self.model = models[0]
+                return self.model
+        except Exception as e:
+            print(f"     ⚠️ Could not detect model: {e}")
+        self.model = fallback
+        return self.model
+
+    def _payload(self, prompt, stream, options=None, **extra):
+        payload = {"model": self.model or DEFAULT_MODEL, "prompt": prompt, "stream": stream}
+        if options:
+            payload["options"] = options
+        payload.update(extra)
+        return payload
+
+    def generate(self, prompt, options=None, **extra):
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            json=self._payload(prompt, False, options, **extra),
+            timeout=self.timeout
+        )
+        if response.status_code != 200:
+            raise OllamaError(f"Ollama Error: {response.status_code} (Check if model name matches)")
+        return response.json().get("response", "")
+
+    def stream(self, prompt, options=None, **extra):
+        """
+        Yields response tokens as Ollama produces them.
+        Closing the generator (or breaking out of the loop) drops the connection,
+        which cancels the generation on the server.
+        """
+        response = self.session.post(
+            f"{self.base_url}/api/generate",
+            json=self._payload(prompt, True, options, **extra),
+            timeout=self.timeout,
+            stream=True
+        )
+        try:
+            if response.status_code != 200:
+                raise OllamaError(f"Ollama Error: {response.status_code} (Check if model name matches)")
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise OllamaError(chunk["error"])
+                if chunk.get("response"):
+                    yield chunk["response"]
+                if chunk.get("done"):
+                    break
+        finally:
+            response.close()
+
+    def generate_until(self, prompt, stop_when=None, options=None, **extra):
+        """
+        Streams the answer and stops as soon as stop_when(text_so_far) is True.
+        Returns the text collected up to that point.
+        """
+        parts = []
+        tokens = self.stream(prompt, options, **extra)
+        try:
+            for token in tokens:
+                parts.append(token)
+                if stop_when and stop_when("".join(parts)):
+                    break
+        finally:
+            tokens.close()
+        return "".join(parts)
+
+
+# ==========================================
+# 🔀 MULTI-BACKEND POOL
+# ==========================================
+
+class Backend:
+    """One Ollama server in a pool: its client plus routing state."""
+    def __init__(self, url, pool_size, timeout):
+        self.client = OllamaClient(url, pool_size=pool_size, timeout=timeout)
+        self.url = self.client.base_url
+        self.outstanding = 0
+        self.served = 0
+        self.healthy = True
+        self.last_error = None
+
+class OllamaPool:
+    """
+    Several Ollama servers behind the OllamaClient interface.
+    - Requests go to the healthy backend with the fewest outstanding requests.
+    - A background /api/tags check every HEALTH_INTERVAL seconds; a backend that
+      errors is skipped until a check succeeds again.
+    - Hedging: if the answer hasn't arrived after the recent p95 latency, the same
+      prompt is sent to a second backend and the first answer wins. The loser's
+      stream is closed, which cancels its generation on the server.
+    """
+    def __init__(self, urls, model=None, pool_size=10, timeout=120, hedge=True):
+        urls = [u for u in urls if u and u.strip()] or [""]
+        self.backends = [Backend(url, pool_size, timeout) for url in urls]
+        self.hedge = hedge and len(self.backends) > 1
+        self.executor = ThreadPoolExecutor(max_workers=pool_size * len(self.backends), thread_name_prefix="ollama")
+        self.latencies = {}   # prompt size bucket -> recent successful durations
+        self.hedges = {"sent": 0, "won": 0}
+        self.lock = threading.Lock()
+        self.checker = None
+        self.model = model
+
+    @property
+    def model(self):
+        return self._model
+
+    @model.setter
+    def model(self, value):
+        self._model = value
+        for backend in self.backends:
+            backend.client.model = value
+
+    # ---- health ----
+
+    def check_health(self):
+        for backend in self.backends:
+            try:
+                backend.client.list_models(timeout=5)
+                error = None
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            with self.lock:
+                if (error is None) != backend.healthy:
+                    print(f"     {'✅' if error is None else '⚠️'} Ollama backend {backend.url} is {'up' if error is None else 'down'}")
+                backend.healthy = error is None
+                backend.last_error = error or backend.last_error
+            metrics.OLLAMA_BACKEND_UP.labels(backend=backend.url).set(1 if error is None else 0)
+
+    def _health_loop(self):
+        while True:
+            time.sleep(HEALTH_INTERVAL)
+            self.check_health()
+
+    def start_health_checks(self):
+        with self.lock:
+            if self.checker is None and len(self.backends) > 1:
+                self.checker = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+                self.checker.start()
+
+    # ---- routing ----
+
+    def acquire(self, exclude=(), allow_unhealthy=True):
+        """Least-outstanding healthy backend (any backend if all are down, unless allow_unhealthy=False)."""
+        self.start_health_checks()
+        with self.lock:
+            candidates = [b for b in self.backends if b not in exclude]
+            healthy = [b for b in candidates if b.healthy]
+            choices = healthy or (candidates if allow_unhealthy else [])
+            if not choices:
+                return None
+            backend = min(choices, key=lambda b: (b.outstanding, b.served))
+            backend.outstanding += 1
+            backend.served += 1
+            return backend
+
+    def release(self, backend, error=None, bucket=None, elapsed=None):
+        with self.lock:
+            backend.outstanding -= 1
+            if error is not None:
+                backend.healthy = False
+                backend.last_error = f"{type(error).__name__}: {error}"
+            elif elapsed is not None:
+                self.latencies.setdefault(bucket, collections.deque(maxlen=200)).append(elapsed)
+
+    @staticmethod
+    def bucket(prompt):
+        # Batched prompts take longer than single ones; keep their latencies apart
+        return int(math.log2(max(len(prompt), 1)))
+
+    def hedge_delay(self, bucket):
+        with self.lock:
+            samples = sorted(self.latencies.get(bucket, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, samples[int(0.95 * (len(samples) - 1))])
+
+    # ---- requests ----
+
+    def _run(self, backend, prompt, stop_when, cancel, options, extra):
+        start = time.perf_counter()
+        try:
+            text = backend.client.generate_until(
+                prompt,
+                stop_when=lambda t: cancel.is_set() or bool(stop_when and stop_when(t)),
+                options=options,
+                **extra
+            )
+        except Exception as e:
+            self.release(backend, error=e)
+            raise
+        # A cancelled loser's time says nothing about the backend
+        self.release(backend, bucket=self.bucket(prompt), elapsed=None if cancel.is_set() else time.perf_counter() - start)
+        return text
+
+    def generate_until(self, prompt, stop_when=None, options=None, **extra):
+        """
+        Same contract as OllamaClient.generate_until, across the pool.
+        A failed backend is retried once elsewhere; a slow one is hedged.
+        """
+        cancel = threading.Event()
+        primary = self.acquire()
+        futures = {self.executor.submit(self._run, primary, prompt, stop_when, cancel, options, extra): primary}
+        delay = self.hedge_delay(self.bucket(prompt)) if self.hedge else None
+        second_sent = False
+        errors = []
+
+        while futures:
+            done, _ = wait(futures, timeout=None if second_sent else delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # Slower than p95: race the next healthiest backend
+                second_sent = True
+                backup = self.acquire(exclude=list(futures.values()), allow_unhealthy=False)
+                if backup is not None:
+                    futures[self.executor.submit(self._run, backup, prompt, stop_when, cancel, options, extra)] = backup
+                    with self.lock:
+                        self.hedges["sent"] += 1
+                    metrics.LLM_HEDGES.labels(outcome="sent").inc()
+                continue
+
+            for future in done:
+                backend = futures.pop(future)
+                try:
+                    text = future.result()
+                except Exception as e:
+                    errors.append(f"{backend.url}: {e}")
+                    if not second_sent and len(self.backends) > 1:
+                        second_sent = True
+                        retry = self.acquire(exclude=[backend] + list(futures.values()), allow_unhealthy=False)
+                        if retry is not None:
+                            print(f"     ⚠️ Ollama backend {backend.url} failed, retrying on {retry.url}")
+                            futures[self.executor.submit(self._run, retry, prompt, stop_when, cancel, options, extra)] = retry
+                    continue
+
+                cancel.set()
+                if backend is not primary and errors == []:
+                    with self.lock:
+                        self.hedges["won"] += 1
+                    metrics.LLM_HEDGES.labels(outcome="won").inc()
+                return text
+
+        raise OllamaError("; ".join(errors) or "no Ollama backend answered")
+
+    def generate(self, prompt, options=None, **extra):
+        # Streamed under the hood so a losing hedge can be cancelled
+        return self.generate_until(prompt, None, options, **extra)
+
+    def stream(self, prompt, options=None, **extra):
+        backend = self.acquire()
+        error = None
+        try:
+            yield from backend.client.stream(prompt, options, **extra)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.release(backend, error=error)
+
+    def list_models(self, timeout=10):
+        errors = []
+        for backend in sorted(self.backends, key=lambda b: not b.healthy):
+            try:
+                return backend.client.list_models(timeout=timeout)
+            except Exception as e:
+                errors.append(f"{backend.url}: {e}")
+        raise OllamaError("; ".join(errors))
+
+    def detect_model(self, fallback=DEFAULT_MODEL):
+        """Picks the first installed model on any reachable backend and remembers it."""
+        try:
+            models = self.list_models()
+            if models:
+                self.model = models[0]
+                return self.model
+        except Exception as e:
+            print(f"     ⚠️ Could not detect model: {e}")
+        self.model = fallback
+        return self.model
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hedges": dict(self.hedges),
+                "backends": {
+                    b.url: {"healthy": b.healthy, "outstanding": b.outstanding, "served": b.served, "last_error": b.last_error}
+                    for b in self.backends
+                }
+            }
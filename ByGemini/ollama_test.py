@@ -1,13 +1,11 @@
 import os
-import requests
 from dotenv import load_dotenv
+from ollama_client import OllamaClient, DEFAULT_MODEL
 
 load_dotenv()
 
 # 1. Get URL from .env
 OLLAMA_URL = os.getenv("OLLAMA_URL")
-# Make sure this matches what you pulled in Colab (llama3, phi3, etc.)
-MODEL_NAME = "llama3" 
 
 print(f"🔎 Testing Connection to: {OLLAMA_URL}")
 
@@ -15,35 +13,27 @@ if not OLLAMA_URL:
     print("❌ ERROR: OLLAMA_URL is missing in .env file")
     exit()
 
-# 2. Define Headers (Critical for Ngrok)
-headers = {
-    "ngrok-skip-browser-warning": "true",
-    "Content-Type": "application/json"
-}
-
-# 3. Simple Prompt Payload
-payload = {
-    "model": MODEL_NAME,
-    "prompt": "Say 'Hello from Google Colab' if you can hear me.",
-    "stream": False
-}
+# 2. Pooled client (sends the Ngrok header for us)
+client = OllamaClient(OLLAMA_URL, timeout=30)
 
 try:
-    print("⏳ Sending request... (Wait 10s)")
-    response = requests.post(
-        f"{OLLAMA_URL}/api/generate", 
-        json=payload, 
-        headers=headers, 
-        timeout=30
-    )
-
-    # 4. Check Response
-    if response.status_code == 200:
-        print("\n✅ SUCCESS! Connected to Colab.")
-        print(f"🤖 AI Response: {response.json().get('response')}")
-    else:
-        print(f"\n❌ FAILED. Status Code: {response.status_code}")
-        print(f"⚠️ Response Text: {response.text[:200]}") # Print first 200 chars to see error
-        
+    # 3. Which model did you pull in Colab? (llama3, phi3, etc.) -- one /api/tags request
+    models = client.list_models()
+    print(f"📦 Installed models: {', '.join(models) or 'none'}")
+    MODEL_NAME = client.model = models[0] if models else DEFAULT_MODEL
+
+    # 4. Stream the answer token by token; it only works once the first token is back
+    print(f"⏳ Sending request to {MODEL_NAME}... (Wait 10s)")
+    connected = False
+    for token in client.stream("Say 'Hello from Google Colab' if you can hear me."):
+        if not connected:
+            connected = True
+            print("\n✅ SUCCESS! Connected to Colab.")
+            print("🤖 AI Response: ", end="", flush=True)
+        print(token, end="", flush=True)
+    print()
+    if not connected:
+        print("❌ ERROR: Connected, but the model returned no tokens.")
+
 except Exception as e:
-    print(f"\n❌ CONNECTION ERROR: {e}")
\ No newline at end of file
+    print(f"\n❌ CONNECTION ERROR: {e}")
@@ -1,7 +1,11 @@
 import os
+import argparse
 import datetime
-from pymongo import MongoClient
+from pymongo import UpdateOne, DeleteOne, ASCENDING, DESCENDING
+from db import get_db
 from dotenv import load_dotenv
+from keywords import scan_title, score_category
+import metrics
 
 # Load Environment Variables
 load_dotenv()
@@ -10,15 +14,21 @@ load_dotenv()
 # ⚙️ CONFIGURATION & RULES
 # ==========================================
 
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = "autox_india"
 
-# 🚫 Blocklist: Topics to auto-reject (add more as needed)
-BLOCKWORDS = [
-    "celebrity gossip", "movie review", "trailer", "box office", 
-    "sports score", "cricket match result", "big boss", "reality show",
-    "dating", "fashion", "horoscope"
-]
+TOP_K = 5
+
+# Bump when the scoring rules (or keywords.py) change: stored scores are then recomputed
+SCORING_VERSION = 1
+# Re-read this many seconds before the watermark, for sentinel writes that land late
+WATERMARK_OVERLAP = int(os.getenv("PROCESSOR_WATERMARK_OVERLAP", "60"))
+# topic_scores writes are sent in chunks of this size, so memory stays flat however many topics come in
+SCORE_FLUSH_SIZE = int(os.getenv("PROCESSOR_FLUSH_SIZE", "1000"))
+
+# Only the fields the scoring engine reads
+RAW_TOPIC_PROJECTION = {
+    "_id": 1, "title": 1, "category": 1, "source_link": 1,
+    "x_trending": 1, "trend_rank": 1, "collected_at": 1, "updated_at": 1
+}
 
 # ==========================================
 # 🧮 SCORING ENGINE (Your Logic)
@@ -42,17 +52,7 @@ def get_category_score(category_str):
     PART B — Category Score (0–45)
     Parses the "Category / Category" string from Step 1
     """
-    score = 0
-    # Convert string to lowercase for checking
-    cat_lower = category_str.lower()
-    
-    # Check keywords inside the category string
-    if "politics" in cat_lower: score += 20
-    if "hindu" in cat_lower or "culture" in cat_lower: score += 15
-    if "global" in cat_lower: score += 10
-    if "humanity" in cat_lower or "social" in cat_lower: score += 10
-    
-    return score
+    return score_category(category_str)
 
 def get_freshness_score(collected_date_str):
     """
@@ -70,11 +70,7 @@ def is_blocked(title):
     PART E — Filtering Rules
     Returns True if title contains any block words.
     """
-    title_lower = title.lower()
-    for word in BLOCKWORDS:
-        if word in title_lower:
-            return True
-    return False
+    return bool(scan_title(title)["blocked"])
 
 def calculate_final_score(doc):
     """
@@ -99,75 +95,181 @@ def calculate_final_score(doc):
 # 🚀 MAIN PROCESSING LOOP
 # ==========================================
 
-def process_topics():
+def build_approved_topic(doc, score_data, today_str):
+    # Create the "Approved" Object
+    return {
+        "title": doc.get('title', 'No Title'),
+        "category": doc.get('category'),
+        "source_link": doc.get('source_link'),
+        "x_trending": doc.get('x_trending'),
+        "trend_rank": doc.get('trend_rank'),
+        "score": score_data['total'],
+        "score_breakdown": score_data['breakdown'],
+        "date": today_str,
+        "status": "approved_for_ai", # Ready for Step 3
+        "created_at": datetime.datetime.now()
+    }
+
+def score_changes(raw_cursor, today_str, scores, settled=None):
+    """
+    Scores every raw topic the cursor yields into the scores collection (topic_scores),
+    SCORE_FLUSH_SIZE docs at a time. Blocked topics lose any score they had.
+    settled: the previous watermark. Docs from the overlap before it whose stored score
+    already has the same updated_at and SCORING_VERSION are skipped, not rescored.
+    Returns (number of docs scored, number of docs seen, newest updated_at seen).
+    """
+    scored_count = 0
+    seen = 0
+    newest = None
+    scored_at = datetime.datetime.now()
+    chunk = []
+
+    def flush(docs):
+        known = {}
+        overlap = [d["_id"] for d in docs if settled and d.get("updated_at") and d["updated_at"] <= settled]
+        if overlap:
+            cursor = scores.find({"_id": {"$in": overlap}}, {"source_updated_at": 1, "score_version": 1})
+            known = {row["_id"]: row for row in cursor}
+
+        operations = []
+        for doc in docs:
+            title = doc.get('title', 'No Title')
+            row = known.get(doc["_id"])
+            in_overlap = settled and doc.get("updated_at") and doc["updated_at"] <= settled
+
+            # A. Blocklist Check (a title edited onto the blocklist must leave the ranking too)
+            if is_blocked(title):
+                if in_overlap and row is None:
+                    continue
+                print(f"   🚫 Blocked: {title[:30]}...")
+                operations.append(DeleteOne({"_id": doc["_id"]}))
+                continue
+
+            # Re-read by the overlap, but already scored in this version
+            if row and row.get("source_updated_at") == doc.get("updated_at") and row.get("score_version") == SCORING_VERSION:
+                continue
+
+            # B. Calculate Score (kept per raw topic, so the next run only scores what changed)
+            score_data = calculate_final_score(doc)
+            scored = build_approved_topic(doc, score_data, today_str)
+            for key in ("status", "created_at"):
+                scored.pop(key)
+            scored.update(scored_at=scored_at, score_version=SCORING_VERSION, source_updated_at=doc.get("updated_at"))
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": scored}, upsert=True))
+
+        if operations:
+            scores.bulk_write(operations, ordered=False)
+        return len(operations)
+
+    for seen, doc in enumerate(raw_cursor, start=1):
+        if doc.get('updated_at') and (newest is None or doc['updated_at'] > newest):
+            newest = doc['updated_at']
+        chunk.append(doc)
+        if len(chunk) >= SCORE_FLUSH_SIZE:
+            scored_count += flush(chunk)
+            chunk = []
+
+    if chunk:
+        scored_count += flush(chunk)
+    return scored_count, seen, newest
+
+def current_top_topics(db, today_str, k=TOP_K):
+    """Running top-k of the day, straight off the date_score_id index (earlier topics win ties)."""
+    cursor = db.topic_scores.find({"date": today_str}, {"scored_at": 0, "score_version": 0, "source_updated_at": 0})
+    return list(cursor.sort([("score", DESCENDING), ("_id", ASCENDING)]).limit(k))
+
+def process_topics(db=None, full=False):
+    """
+    Incremental Step 2: only raw topics collected or updated since the last run are scored.
+    full=True (or a new day, or a SCORING_VERSION bump) rescores every topic of the day.
+    Returns the number of raw topics scored.
+    """
     print("--- 🧠 Step 2: Processor Started ---")
     
-    # 1. Connect to DB
-    client = MongoClient(MONGO_URI)
-    db = client[DB_NAME]
+    # 1. Connect to DB (unless the pipeline runner shares its own)
+    if db is None:
+        db = get_db()
     
-    # 2. Get Today's Raw Topics
+    # 2. Stream Today's New/Changed Raw Topics (projection keeps each doc small)
     today_str = datetime.date.today().isoformat()
-    raw_cursor = db.raw_topics.find({"collected_at": today_str})
-    raw_topics = list(raw_cursor)
-    
-    if not raw_topics:
-        print("   ⚠️ No raw topics found for today. Run Step 1 (sentinel.py) first.")
-        return
-
-    print(f"   📥 Fetched {len(raw_topics)} raw topics.")
-
-    scored_topics = []
-
-    # 3. Filter & Score Loop
-    for doc in raw_topics:
-        title = doc.get('title', 'No Title')
-        
-        # A. Blocklist Check
-        if is_blocked(title):
-            print(f"   🚫 Blocked: {title[:30]}...")
-            continue
-            
-        # B. Calculate Score
-        score_data = calculate_final_score(doc)
-        
-        # Create the "Approved" Object
-        approved_topic = {
-            "title": title,
-            "category": doc.get('category'),
-            "source_link": doc.get('source_link'),
-            "x_trending": doc.get('x_trending'),
-            "trend_rank": doc.get('trend_rank'),
-            "score": score_data['total'],
-            "score_breakdown": score_data['breakdown'],
-            "date": today_str,
-            "status": "approved_for_ai", # Ready for Step 3
-            "created_at": datetime.datetime.now()
-        }
-        
-        scored_topics.append(approved_topic)
+    state = db.processor_state.find_one({"_id": today_str}) or {}
+    incremental = not full and state.get("score_version") == SCORING_VERSION and state.get("watermark")
 
-    # 4. Sort by Score (Highest First)
-    scored_topics.sort(key=lambda x: x['score'], reverse=True)
-    
-    # 5. Pick Top 5
-    top_5 = scored_topics[:5]
-    
-    # 6. Save to 'top_topics' Collection (Upsert to avoid dupes)
-    if top_5:
-        print(f"\n   🏆 Top {len(top_5)} Topics Selected:")
-        for i, topic in enumerate(top_5):
-            print(f"      {i+1}. [{topic['score']} pts] {topic['title'][:50]}...")
-            
-            # Upsert: If title exists for today, update it; otherwise insert
-            db.top_topics.update_one(
-                {"title": topic["title"], "date": topic["date"]}, 
-                {"$set": topic}, 
-                upsert=True
-            )
-        print("\n   ✅ Saved to 'top_topics' collection.")
-    else:
+    query = {"collected_at": today_str}
+    if incremental:
+        query["updated_at"] = {"$gt": state["watermark"] - datetime.timedelta(seconds=WATERMARK_OVERLAP)}
+    raw_cursor = db.raw_topics.find(query, RAW_TOPIC_PROJECTION)
+
+    # 3. Filter & Score
+    settled = state["watermark"] if incremental else None
+    scored, seen, newest = score_changes(raw_cursor, today_str, db.topic_scores, settled)
+
+    if not scored:
+        if incremental:
+            print("   💤 No new or changed raw topics since the last run.")
+        else:
+            print("   ⚠️ No raw topics found for today. Run Step 1 (sentinel.py) first.")
+        return 0
+
+    label = "new/changed " if incremental else ""
+    skipped = f" ({seen - scored} re-read unchanged)" if seen > scored else ""
+    print(f"   📥 Scored {scored} {label}raw topics{skipped}.")
+    metrics.STAGE_ITEMS.labels(stage="processor").inc(scored)
+
+    watermark = max(filter(None, [newest, state.get("watermark") if incremental else None]), default=None)
+    db.processor_state.update_one(
+        {"_id": today_str},
+        {"$set": {"watermark": watermark, "score_version": SCORING_VERSION, "updated_at": datetime.datetime.now()}},
+        upsert=True
+    )
+
+    # 4. Merge into the day's running Top 5
+    top_5 = current_top_topics(db, today_str)
+    if not top_5:
         print("   ⚠️ No viable topics found after filtering.")
+        return scored
+
+    ranking = [[t["title"], t["score"]] for t in top_5]
+    if ranking == state.get("top"):
+        print(f"   🏆 Top {len(top_5)} unchanged.")
+        return scored
+
+    # 5. Save to 'top_topics' Collection in one round-trip (Upsert to avoid dupes)
+    print(f"\n   🏆 Top {len(top_5)} Topics Selected:")
+    operations = []
+    for i, topic in enumerate(top_5):
+        print(f"      {i+1}. [{topic['score']} pts] {topic['title'][:50]}...")
+        topic.pop("_id")
+
+        # Upsert: If title exists for today, update it; otherwise insert.
+        # Status only on insert: a topic already generated must not go back to Step 3
+        operations.append(UpdateOne(
+            {"title": topic["title"], "date": topic["date"]},
+            {"$set": topic, "$setOnInsert": {"status": "approved_for_ai", "created_at": datetime.datetime.now()}},
+            upsert=True
+        ))
+    db.top_topics.bulk_write(operations, ordered=False)
+
+    # Topics that fell out of the Top 5 before Step 3 picked them up are withdrawn,
+    # and withdrawn ones that made it back are approved again
+    titles = [title for title, _ in ranking]
+    db.top_topics.update_many(
+        {"title": {"$in": titles}, "date": today_str, "status": "displaced"},
+        {"$set": {"status": "approved_for_ai"}}
+    )
+    dropped = [title for title, _ in state.get("top") or [] if title not in titles]
+    if dropped:
+        withdrawn = db.top_topics.update_many(
+            {"title": {"$in": dropped}, "date": today_str, "status": "approved_for_ai", "lease_owner": None},
+            {"$set": {"status": "displaced"}}
+        ).modified_count
+        if withdrawn:
+            print(f"   ↩️ Withdrew {withdrawn} displaced topic(s).")
+    db.processor_state.update_one({"_id": today_str}, {"$set": {"top": ranking}})
+    print("\n   ✅ Saved to 'top_topics' collection.")
+    return scored
 
 if __name__ == "__main__":
-    process_topics()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Step 2: score raw topics")
+    parser.add_argument("--full", action="store_true", help="rescore every topic of the day")
+    process_topics(full=parser.parse_args().full)
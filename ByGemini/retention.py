@@ -0,0 +1,174 @@
+import os
+import gzip
+import argparse
+import datetime
+from bson import json_util
+from pymongo.errors import PyMongoError
+from db import get_db, HOT_TTL_DAYS, POSTED_TTL_DAYS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional: Parquet archives
+    pyarrow = None
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+# Run daily (cron / Task Scheduler):  python retention.py archive
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "3"))
+ARCHIVE_BATCH = 1000
+
+# collection -> (time field the archive is partitioned by, what may leave the hot set, TTL days)
+ARCHIVE_POLICIES = {
+    "raw_topics": ("updated_at", {}, HOT_TTL_DAYS),
+    # Topics still waiting for Step 3 stay hot
+    "top_topics": ("created_at", {"status": {"$ne": "approved_for_ai"}}, HOT_TTL_DAYS),
+    # Only posted tweets; anything still on the dashboard stays hot
+    "final_tweets": ("posted_at", {"status": "posted"}, POSTED_TTL_DAYS)
+}
+
+# ==========================================
+# 🧊 ARCHIVE (MongoDB -> date-partitioned files)
+# ==========================================
+
+def partition_path(collection, day, run_id, fmt):
+    """archive/<collection>/<YYYY-MM-DD>/<run>.jsonl.gz (one file per run, so reruns never overwrite)."""
+    folder = os.path.join(ARCHIVE_DIR, collection, day)
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{run_id}.{'parquet' if fmt == 'parquet' else 'jsonl.gz'}")
+
+def write_partition(path, docs, fmt):
+    if fmt == "parquet":
+        # Extended JSON per row keeps ObjectIds/dates exact; DuckDB/pandas can still filter on it
+        rows = [{"_id": str(d["_id"]), "doc": json_util.dumps(d)} for d in docs]
+        table = pyarrow.Table.from_pylist(rows)
+        if os.path.exists(path):
+            table = pyarrow.concat_tables([pyarrow.parquet.read_table(path), table])
+        pyarrow.parquet.write_table(table, path, compression="zstd")
+        return
+    # gzip members can be appended; readers see one continuous stream
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for doc in docs:
+            f.write(json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS) + "\n")
+
+def archive_collection(db, collection, older_than_days=ARCHIVE_AFTER_DAYS, fmt="jsonl", dry_run=False):
+    """
+    Moves documents older than the cutoff into archive files, oldest first,
+    ARCHIVE_BATCH at a time. A batch is deleted only after its files are written,
+    so a crash can duplicate a few archived rows but never lose one.
+    Returns the number of documents archived.
+    """
+    time_field, extra, _ = ARCHIVE_POLICIES[collection]
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=older_than_days)
+    query = dict(extra, **{time_field: {"$lt": cutoff}})
+    run_id = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+
+    if dry_run:
+        return db[collection].count_documents(query)
+
+    moved = 0
+    while True:
+        batch = list(db[collection].find(query).sort(time_field, 1).limit(ARCHIVE_BATCH))
+        if not batch:
+            break
+
+        by_day = {}
+        for doc in batch:
+            stamp = doc.get(time_field)
+            day = stamp.date().isoformat() if isinstance(stamp, datetime.datetime) else "undated"
+            by_day.setdefault(day, []).append(doc)
+        for day, docs in by_day.items():
+            write_partition(partition_path(collection, day, run_id, fmt), docs, fmt)
+
+        db[collection].delete_many({"_id": {"$in": [doc["_id"] for doc in batch]}})
+        moved += len(batch)
+    return moved
+
+def run_archive(db=None, older_than_days=ARCHIVE_AFTER_DAYS, fmt="jsonl", dry_run=False):
+    print(f"--- 🧊 Archiving documents older than {older_than_days} days ({fmt}) ---")
+    if db is None:
+        db = get_db()
+    if fmt == "parquet" and pyarrow is None:
+        print("   ⚠️ pyarrow is not installed, writing JSONL instead.")
+        fmt = "jsonl"
+
+    for collection, (_, _, ttl_days) in ARCHIVE_POLICIES.items():
+        if older_than_days >= ttl_days:
+            print(f"   ⚠️ {collection}: TTL ({ttl_days}d) expires documents before they are {older_than_days}d old, archive runs too late.")
+        try:
+            moved = archive_collection(db, collection, older_than_days, fmt, dry_run)
+        except (PyMongoError, OSError) as e:
+            print(f"   ❌ {collection}: {e}")
+            continue
+        print(f"   {'🔎 Would archive' if dry_run else '📦 Archived'} {moved} from {collection}")
+
+# ==========================================
+# 🔍 QUERY THE ARCHIVE
+# ==========================================
+
+def read_partition(path):
+    if path.endswith(".parquet"):
+        if pyarrow is None:
+            print(f"   ⚠️ Skipping {path}: pyarrow is not installed.")
+            return
+        for row in pyarrow.parquet.read_table(path).to_pylist():
+            yield json_util.loads(row["doc"])
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json_util.loads(line)
+
+def read_archive(collection, start=None, end=None, match=None):
+    """
+    Yields archived documents of collection for days start..end (ISO dates, inclusive),
+    optionally filtered by field equality, e.g. match={"status": "posted"}.
+    Rows duplicated by an interrupted run are returned once.
+    """
+    root = os.path.join(ARCHIVE_DIR, collection)
+    if not os.path.isdir(root):
+        return
+    seen = set()
+    for day in sorted(os.listdir(root)):
+        if (start and day < start) or (end and day > end):
+            continue
+        for name in sorted(os.listdir(os.path.join(root, day))):
+            for doc in read_partition(os.path.join(root, day, name)):
+                if doc["_id"] in seen:
+                    continue
+                seen.add(doc["_id"])
+                if match and any(doc.get(k) != v for k, v in match.items()):
+                    continue
+                yield doc
+
+# ==========================================
+# 🚀 MAIN
+# ==========================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Retention: archive cold data, query the archive")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    archive = commands.add_parser("archive", help="move aged documents out of MongoDB")
+    archive.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    archive.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    archive.add_argument("--dry-run", action="store_true", help="only count what would move")
+
+    query = commands.add_parser("query", help="print archived documents as JSON lines")
+    query.add_argument("collection", choices=list(ARCHIVE_POLICIES))
+    query.add_argument("--from", dest="start", help="first day, YYYY-MM-DD")
+    query.add_argument("--to", dest="end", help="last day, YYYY-MM-DD")
+    query.add_argument("--match", action="append", default=[], help="field=value (repeatable)")
+
+    args = parser.parse_args()
+    if args.command == "archive":
+        run_archive(older_than_days=args.days, fmt=args.format, dry_run=args.dry_run)
+    else:
+        match = dict(item.split("=", 1) for item in args.match)
+        for doc in read_archive(args.collection, args.start, args.end, match):
+            print(json_util.dumps(doc, json_options=json_util.RELAXED_JSON_OPTIONS, ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,19 @@ import feedparser
 import re
 import datetime
 import os
+import atexit
+import queue
+import threading
+import requests
+from html.parser import HTMLParser
+from concurrent.futures import Future, ThreadPoolExecutor
 from dotenv import load_dotenv
-from pymongo import MongoClient, UpdateOne
-from playwright.sync_api import sync_playwright
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from db import get_db
+from keywords import scan_title
+from dedupe import get_story_index
+import metrics
 
 # Load environment variables (Security Best Practice)
 load_dotenv()
@@ -21,29 +31,28 @@ RSS_FEEDS = [
     "https://news.google.com/rss/search?q=India+Foreign+Policy&hl=en-IN&gl=IN&ceid=IN:en"
 ]
 
-TAGS = {
-    "Hindu / Culture": ["ram", "mandir", "diwali", "sanatan", "temple", "ayodhya", "culture", "dharma"],
-    "Indian Politics": ["modi", "bjp", "congress", "parliament", "election", "government", "cabinet"],
-    "Global / India": ["pakistan", "china", "usa", "ukraine", "israel", "russia", "geopolitics"],
-    "Humanity / Social": ["help", "rescue", "donation", "relief", "save", "crisis"]
-}
+# Parallel feed downloads (total time ≈ slowest feed, not the sum of all feeds)
+RSS_WORKERS = int(os.getenv("RSS_WORKERS", "16"))
+RSS_ENTRIES_PER_FEED = 5
+RSS_TIMEOUT = float(os.getenv("RSS_TIMEOUT", "20"))   # seconds per feed download
+
+TRENDS_URL = "https://trends24.in/india/"
+TRENDS_LIMIT = 10
+# Set TRENDS_USE_BROWSER=1 to skip the plain HTTP collector and always use Playwright
+TRENDS_USE_BROWSER = os.getenv("TRENDS_USE_BROWSER", "0") == "1"
+HTTP_HEADERS = {"User-Agent": "Mozilla/5.0 (AutoX India Sentinel)"}
 
 # ==========================================
 # 🗄️ MONGODB CONNECTION
 # ==========================================
 
 def get_mongo_collection():
-    uri = os.getenv("MONGO_URI")
-    if not uri:
-        raise ValueError("❌ MONGO_URI not found in .env file")
-    
     try:
-        client = MongoClient(uri)
+        db = get_db()
         # Send a ping to confirm a successful connection
-        client.admin.command('ping')
+        db.client.admin.command('ping')
         print("   ✅ Connected to MongoDB Atlas")
         
-        db = client["autox_india"]
         return db["raw_topics"]
     except Exception as e:
         print(f"   ❌ MongoDB Connection Error: {e}")
@@ -60,108 +69,353 @@ def clean_title(title):
     return title.strip()
 
 def derive_category(title):
-    # Step 1 Part D: Keyword Tagging
-    title_lower = title.lower()
-    found_categories = []
-    
-    for category_name, keywords in TAGS.items():
-        if any(keyword in title_lower for keyword in keywords):
-            found_categories.append(category_name)
-            
-    if not found_categories:
-        return "General News"
-    
-    # Return as a string "Cat1 / Cat2" as per your JSON spec
-    return " / ".join(found_categories)
+    # Step 1 Part D: Keyword Tagging (one pass of the shared compiled matcher)
+    # Returns a string "Cat1 / Cat2" as per your JSON spec
+    return scan_title(title)["category"]
+
+def story_upsert(index, doc):
+    """
+    Upsert for one headline, folded into today's canonical story when it is
+    a near-duplicate (same story from another outlet or a trend hashtag).
+    Only trend events set x_trending/trend_rank; news only fills them in on insert,
+    so a late news write never un-trends a story.
+    Prints and returns the UpdateOne.
+    """
+    story, _ = index.resolve(doc["title"], doc["x_trending"], doc["trend_rank"])
+    source = {"name": doc["source"], "link": doc["source_link"]}
+    trend = {"x_trending": story["x_trending"], "trend_rank": story["trend_rank"]}
+    fields = {k: v for k, v in doc.items() if k not in trend}
+    if doc["x_trending"]:
+        update = {"$set": trend}
+    else:
+        update = {"$setOnInsert": trend}
+
+    if story["title"] == doc["title"]:
+        # Canonical headline: UpdateOne with upsert=True prevents duplicates based on 'title'
+        update["$set"] = dict(update.get("$set", {}), **fields)
+        update["$addToSet"] = {"sources": source}
+        return UpdateOne({"title": doc["title"]}, update, upsert=True)
+
+    print(f"      🔗 Same story as: {story['title'][:50]}")
+    update["$set"] = dict(update.get("$set", {}), updated_at=doc["updated_at"])
+    update["$addToSet"] = {"sources": source, "aliases": doc["title"]}
+    return UpdateOne({"title": story["title"]}, update, upsert=True)
+
+def write_stories(collection, operations):
+    """
+    Unordered bulk upsert. Two sentinels upserting the same new title can hit the
+    unique index; those writes are retried once, when they become plain updates.
+    """
+    try:
+        result = collection.bulk_write(operations, ordered=False).bulk_api_result
+    except BulkWriteError as e:
+        result = e.details
+        errors = result.get("writeErrors", [])
+        if any(err["code"] != 11000 for err in errors):
+            raise
+        retry = collection.bulk_write([operations[err["index"]] for err in errors], ordered=False)
+        result["nModified"] += retry.modified_count
+        result["nUpserted"] += retry.upserted_count
+    print(f"   💾 Bulk Write: {result['nUpserted']} new, {result['nModified']} updated.")
 
 # ==========================================
 # 📡 PART A: FETCH NEWS (RSS)
 # ==========================================
 
+def load_feed_state(collection):
+    """
+    Returns {url: {"etag": ..., "modified": ...}} saved by the previous run.
+    Stored next to raw_topics in the 'feed_state' collection.
+    """
+    state = {}
+    for row in collection.database.feed_state.find({}, {"_id": 0, "url": 1, "etag": 1, "modified": 1}):
+        state[row["url"]] = row
+    return state
+
+def fetch_feed(url, cached):
+    """
+    Downloads one feed with a conditional GET (If-None-Match / If-Modified-Since).
+    Returns (parsed feed, validators), or None when the server answers 304 Not Modified.
+    requests does the download so a stuck server can't hang the pool (feedparser has no timeout).
+    """
+    headers = dict(HTTP_HEADERS)
+    if cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached.get("modified"):
+        headers["If-Modified-Since"] = cached["modified"]
+
+    response = requests.get(url, headers=headers, timeout=RSS_TIMEOUT)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+    validators = {"etag": response.headers.get("ETag"), "modified": response.headers.get("Last-Modified")}
+    return feedparser.parse(response.content), validators
+
 def fetch_news_topics(collection):
+    """Returns the URLs of feeds that failed (the run itself goes on without them)."""
     print("📡 Fetching RSS Feeds...")
     today = datetime.date.today().isoformat()
     operations = []
-    
-    for url in RSS_FEEDS:
-        try:
-            feed = feedparser.parse(url)
-            for entry in feed.entries[:5]:
-                clean_t = clean_title(entry.title)
-                category = derive_category(clean_t)
-                
-                # Prepare Upsert (Insert if new, Update if exists)
-                doc = {
-                    "title": clean_t,
-                    "category": category,
-                    "source": feed.feed.get('title', 'Google News'),
-                    "source_link": entry.link,
-                    "x_trending": False,
-                    "trend_rank": 0,
-                    "collected_at": today
-                }
-                
-                # UpdateOne with upsert=True prevents duplicates based on 'title'
-                operations.append(
-                    UpdateOne({"title": clean_t}, {"$set": doc}, upsert=True)
-                )
-                print(f"   🔹 [News] {clean_t[:40]}...")
-                
-        except Exception as e:
-            print(f"   ❌ Error fetching feed: {e}")
+    state_updates = []
+    failed = []
+    feed_state = load_feed_state(collection)
+    index = get_story_index(collection, today)
+
+    workers = max(1, min(RSS_WORKERS, len(RSS_FEEDS)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            url: pool.submit(fetch_feed, url, feed_state.get(url, {}))
+            for url in RSS_FEEDS
+        }
+
+        for url, future in futures.items():
+            try:
+                fetched = future.result()
+                if fetched is None:
+                    print(f"   💤 [304] Unchanged: {url[:60]}")
+                    continue
+                feed, validators = fetched
+
+                feed_operations = []
+                for entry in feed.entries[:RSS_ENTRIES_PER_FEED]:
+                    clean_t = clean_title(entry.title)
+                    category = derive_category(clean_t)
+
+                    # Prepare Upsert (Insert if new, Update if exists)
+                    doc = {
+                        "title": clean_t,
+                        "category": category,
+                        "source": feed.feed.get('title', 'Google News'),
+                        "source_link": entry.link,
+                        "x_trending": False,
+                        "trend_rank": 0,
+                        "collected_at": today,
+                        "updated_at": datetime.datetime.now()
+                    }
+
+                    print(f"   🔹 [News] {clean_t[:40]}...")
+                    feed_operations.append(story_upsert(index, doc))
+
+                # Only a fully processed feed may be skipped next time (304),
+                # so its validators are remembered after its entries
+                operations.extend(feed_operations)
+                if validators["etag"] or validators["modified"]:
+                    state_updates.append(UpdateOne(
+                        {"url": url},
+                        {"$set": dict(validators, url=url, checked_at=datetime.datetime.now())},
+                        upsert=True
+                    ))
 
+            except Exception as e:
+                print(f"   ❌ Error fetching feed: {e}")
+                failed.append(url)
+
+    metrics.STAGE_ITEMS.labels(stage="sentinel_news").inc(len(operations))
     if operations:
-        result = collection.bulk_write(operations)
-        print(f"   💾 Bulk Write: {result.upserted_count} new, {result.modified_count} updated.")
+        write_stories(collection, operations)
+
+    if state_updates:
+        collection.database.feed_state.bulk_write(state_updates, ordered=False)
+    return failed
 
 # ==========================================
-# 📈 PART B: FETCH TRENDS (Playwright)
+# 📈 PART B: FETCH TRENDS (HTTP + HTML parser, Playwright fallback)
 # ==========================================
 
+class TrendCardParser(HTMLParser):
+    """
+    Collects every hourly '.trend-card' on trends24.in.
+    self.cards -> [{"hour": "...", "trends": [(title, href), ...]}, ...] (newest first)
+    """
+    def __init__(self):
+        super().__init__()
+        self.cards = []
+        self._card_depth = 0      # div nesting level inside the current card (0 = outside)
+        self._in_hour = False
+        self._link = None         # [text_parts, href] while inside a trend <a>
+        self._in_li = False
+
+    def handle_starttag(self, tag, attrs):
+        classes = (dict(attrs).get("class") or "").split()
+        if tag == "div":
+            if self._card_depth:
+                self._card_depth += 1
+            elif "trend-card" in classes:
+                self._card_depth = 1
+                self.cards.append({"hour": "", "trends": []})
+            return
+        if not self._card_depth:
+            return
+        if tag == "h3":
+            self._in_hour = True
+        elif tag == "li":
+            self._in_li = True
+        elif tag == "a" and self._in_li and self._link is None:
+            self._link = [[], dict(attrs).get("href")]
+
+    def handle_endtag(self, tag):
+        if not self._card_depth:
+            return
+        if tag == "div":
+            self._card_depth -= 1
+        elif tag == "h3":
+            self._in_hour = False
+        elif tag == "li":
+            self._in_li = False
+        elif tag == "a" and self._link is not None:
+            text = "".join(self._link[0]).strip()
+            if text:
+                self.cards[-1]["trends"].append((text, self._link[1]))
+            self._link = None
+
+    def handle_data(self, data):
+        if not self._card_depth:
+            return
+        if self._in_hour:
+            self.cards[-1]["hour"] += data.strip()
+        elif self._link is not None:
+            self._link[0].append(data)
+
+def parse_trend_cards(html):
+    parser = TrendCardParser()
+    parser.feed(html)
+    parser.close()
+    return [card for card in parser.cards if card["trends"]]
+
+def fetch_trends_html():
+    """Default path: one plain HTTP GET, no browser."""
+    response = requests.get(TRENDS_URL, headers=HTTP_HEADERS, timeout=30)
+    response.raise_for_status()
+    return response.text
+
+# Long-lived Playwright state, only started when the HTTP path fails.
+# The sync API is bound to the thread that started it, so one dedicated
+# thread owns it and every browser call (including the close at exit) runs there.
+_BROWSER = {"playwright": None, "browser": None, "context": None, "thread": None}
+_BROWSER_JOBS = queue.Queue()
+_BROWSER_LOCK = threading.Lock()
+
+def browser_thread():
+    while True:
+        fn, future = _BROWSER_JOBS.get()
+        try:
+            future.set_result(fn())
+        except Exception as e:
+            future.set_exception(e)
+
+def on_browser_thread(fn):
+    """Runs fn on the Playwright thread (started on first use) and returns its result."""
+    with _BROWSER_LOCK:
+        if _BROWSER["thread"] is None:
+            _BROWSER["thread"] = threading.Thread(target=browser_thread, name="playwright", daemon=True)
+            _BROWSER["thread"].start()
+            atexit.register(close_browser)
+    future = Future()
+    _BROWSER_JOBS.put((fn, future))
+    return future.result()
+
+def get_browser_context():
+    # Playwright thread only
+    if _BROWSER["context"] is None:
+        from playwright.sync_api import sync_playwright
+        _BROWSER["playwright"] = sync_playwright().start()
+        _BROWSER["browser"] = _BROWSER["playwright"].chromium.launch(headless=True)
+        _BROWSER["context"] = _BROWSER["browser"].new_context()
+    return _BROWSER["context"]
+
+def shutdown_browser():
+    # Playwright thread only
+    if _BROWSER["browser"] is not None:
+        _BROWSER["browser"].close()
+    if _BROWSER["playwright"] is not None:
+        _BROWSER["playwright"].stop()
+    _BROWSER.update(playwright=None, browser=None, context=None)
+
+def close_browser():
+    if _BROWSER["thread"] is not None:
+        on_browser_thread(shutdown_browser)
+
+def render_trends_page():
+    # Playwright thread only
+    page = get_browser_context().new_page()
+    try:
+        page.goto(TRENDS_URL, timeout=60000)
+        page.wait_for_selector(".trend-card", timeout=30000)
+        return page.content()
+    finally:
+        page.close()
+
+def fetch_trends_html_browser():
+    """Fallback path: render the page in the shared browser context."""
+    return on_browser_thread(render_trends_page)
+
+def collect_trend_cards():
+    if not TRENDS_USE_BROWSER:
+        try:
+            cards = parse_trend_cards(fetch_trends_html())
+            if cards:
+                return cards
+            print("   ⚠️ No trend cards in plain HTML, falling back to browser.")
+        except Exception as e:
+            print(f"   ⚠️ HTTP trends fetch failed ({e}), falling back to browser.")
+    return parse_trend_cards(fetch_trends_html_browser())
+
+def build_trend_history(cards):
+    """
+    Maps each clean title to its rank in every hourly card it appeared in.
+    {title: [{"hour": "...", "rank": 1}, ...]}
+    """
+    history = {}
+    for card in cards:
+        for rank, (raw_title, _) in enumerate(card["trends"], start=1):
+            clean_t = clean_title(raw_title)
+            history.setdefault(clean_t, []).append({"hour": card["hour"], "rank": rank})
+    return history
+
 def fetch_x_trends(collection):
     print("📈 Fetching X Trends...")
     today = datetime.date.today().isoformat()
     operations = []
-    
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        
-        try:
-            page.goto("https://trends24.in/india/", timeout=60000)
-            trends = page.locator('.trend-card').first.locator('li a').all()
-            
-            rank = 1
-            for trend in trends[:10]:
-                raw_title = trend.text_content()
-                link = trend.get_attribute('href')
-                clean_t = clean_title(raw_title)
-                category = derive_category(clean_t)
-                
-                doc = {
-                    "title": clean_t,
-                    "category": category,
-                    "source": "X Trends India",
-                    "source_link": link,
-                    "x_trending": True,
-                    "trend_rank": rank,
-                    "collected_at": today
-                }
-                
-                operations.append(
-                    UpdateOne({"title": clean_t}, {"$set": doc}, upsert=True)
-                )
-                print(f"   🔹 [Trend #{rank}] {clean_t}")
-                rank += 1
-                
-        except Exception as e:
-            print(f"   ❌ Error fetching trends: {e}")
-        finally:
-            browser.close()
 
+    try:
+        cards = collect_trend_cards()
+    except Exception as e:
+        print(f"   ❌ Error fetching trends: {e}")
+        return
+
+    if not cards:
+        print("   ⚠️ No trends found.")
+        return
+
+    history = build_trend_history(cards)
+    index = get_story_index(collection, today)
+    print(f"   🕒 Parsed {len(cards)} hourly trend cards.")
+
+    # The newest card decides today's rank; older cards only add history
+    for rank, (raw_title, link) in enumerate(cards[0]["trends"][:TRENDS_LIMIT], start=1):
+        clean_t = clean_title(raw_title)
+        category = derive_category(clean_t)
+        trend_history = history.get(clean_t, [])
+
+        doc = {
+            "title": clean_t,
+            "category": category,
+            "source": "X Trends India",
+            "source_link": link,
+            "x_trending": True,
+            "trend_rank": rank,
+            "trend_history": trend_history,
+            "trend_hours": len(trend_history),
+            "collected_at": today,
+            "updated_at": datetime.datetime.now()
+        }
+
+        print(f"   🔹 [Trend #{rank}] {clean_t} ({len(trend_history)}h)")
+        operations.append(story_upsert(index, doc))
+
+    metrics.STAGE_ITEMS.labels(stage="sentinel_trends").inc(len(operations))
     if operations:
-        result = collection.bulk_write(operations)
-        print(f"   💾 Bulk Write: {result.upserted_count} new, {result.modified_count} updated.")
+        write_stories(collection, operations)
 
 # ==========================================
 # 🚀 MAIN EXECUTION
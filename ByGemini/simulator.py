@@ -0,0 +1,206 @@
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+# Local stand-in for the Colab Ollama tunnel and the Gemini API.
+#   python simulator.py --latency-ms 800 --error-rate 0.05 --max-concurrency 2
+# then point the pipeline at it:
+#   OLLAMA_URL=http://127.0.0.1:11500  GEMINI_API_ENDPOINT=http://127.0.0.1:11500
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench", "fixtures", "llm_responses.json")
+
+CONFIG = {
+    "models": ["llama3:latest"],
+    "latency_ms": 500.0,      # median time to first token
+    "latency_sigma": 0.5,     # lognormal spread (0 = fixed latency)
+    "tokens_per_sec": 40.0,   # streaming speed after the first token
+    "error_rate": 0.0,        # share of requests answered with HTTP 500
+    "hang_rate": 0.0,         # share of requests that stall for hang_ms (timeouts)
+    "hang_ms": 180000.0,
+    "max_concurrency": 4,     # requests served at once; the rest queue (like Ollama)
+    "rate_limit": 0.0,        # requests/sec before HTTP 429 (0 = unlimited, like a Gemini quota)
+    "seed": None
+}
+
+with open(FIXTURES, encoding="utf-8") as f:
+    RECORDED = json.load(f)
+
+app = FastAPI()
+STATE = {"slots": None, "rng": random.Random(), "bucket": 0.0, "bucket_at": time.monotonic(), "served": 0, "failed": 0}
+
+# ==========================================
+# 🎲 BEHAVIOUR MODEL
+# ==========================================
+
+def sample_latency():
+    median = CONFIG["latency_ms"] / 1000.0
+    if CONFIG["latency_sigma"] <= 0:
+        return median
+    return STATE["rng"].lognormvariate(0, CONFIG["latency_sigma"]) * median
+
+def rate_limited():
+    """Token bucket: refills at rate_limit/sec, holds at most one second of burst."""
+    rate = CONFIG["rate_limit"]
+    if rate <= 0:
+        return False
+    now = time.monotonic()
+    STATE["bucket"] = min(rate, STATE["bucket"] + (now - STATE["bucket_at"]) * rate)
+    STATE["bucket_at"] = now
+    if STATE["bucket"] < 1:
+        return True
+    STATE["bucket"] -= 1
+    return False
+
+def fault():
+    """Returns an error response for this request, or None to serve it."""
+    if rate_limited():
+        STATE["failed"] += 1
+        return JSONResponse({"error": "rate limit exceeded"}, status_code=429)
+    if STATE["rng"].random() < CONFIG["error_rate"]:
+        STATE["failed"] += 1
+        return JSONResponse({"error": "simulated backend failure"}, status_code=500)
+    return None
+
+async def maybe_hang():
+    if STATE["rng"].random() < CONFIG["hang_rate"]:
+        await asyncio.sleep(CONFIG["hang_ms"] / 1000.0)
+
+def answer_for(prompt, structured=False):
+    """Plausible recorded answer for each kind of prompt the pipeline sends."""
+    if "For EACH tweet" in prompt:
+        count = max(1, prompt.count('"index":') - 1)
+        return json.dumps({"comments": [{"index": i, "comment": RECORDED["quote_comment"]} for i in range(count)]})
+    if "for EACH topic" in prompt:
+        count = max(1, prompt.count('"id":') - 1)
+        if '"tweet_variants"' in prompt:
+            item = {"tweet_variants": RECORDED["gemini_refine"]["tweet_variants"]}
+        else:
+            item = {"tweets": [line.split(". ", 1)[1] for line in RECORDED["ollama_draft"].splitlines()]}
+        return json.dumps({"drafts": [dict(item, id=i) for i in range(count)]}, ensure_ascii=False)
+    if structured or prompt.startswith(("Refine these", "Repair these")):
+        return json.dumps(RECORDED["gemini_refine"], ensure_ascii=False)
+    if "Quote-Retweet" in prompt:
+        return RECORDED["quote_comment"]
+    return RECORDED["ollama_draft"]
+
+def tokens(text):
+    # Whitespace-preserving "tokens" for streaming
+    parts = text.split(" ")
+    return [p + (" " if i < len(parts) - 1 else "") for i, p in enumerate(parts)]
+
+# ==========================================
+# 🦙 OLLAMA ENDPOINTS
+# ==========================================
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": name, "model": name} for name in CONFIG["models"]]}
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    model = body.get("model") or CONFIG["models"][0]
+    prompt = body.get("prompt", "")
+    text = answer_for(prompt, structured=bool(body.get("format")))
+
+    error = fault()
+    if error is not None:
+        return error
+
+    if not body.get("stream", True):
+        async with STATE["slots"]:
+            await maybe_hang()
+            await asyncio.sleep(sample_latency() + len(tokens(text)) / CONFIG["tokens_per_sec"])
+        STATE["served"] += 1
+        return {"model": model, "response": text, "done": True, "done_reason": "stop"}
+
+    async def stream():
+        async with STATE["slots"]:
+            await maybe_hang()
+            await asyncio.sleep(sample_latency())
+            for token in tokens(text):
+                yield json.dumps({"model": model, "response": token, "done": False}) + "\n"
+                await asyncio.sleep(1.0 / CONFIG["tokens_per_sec"])
+            yield json.dumps({"model": model, "response": "", "done": True, "done_reason": "stop"}) + "\n"
+        STATE["served"] += 1
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# ==========================================
+# ♊ GEMINI-COMPATIBLE ENDPOINT
+# ==========================================
+
+@app.post("/v1beta/models/{target}")
+async def gemini_generate(target: str, request: Request):
+    """POST /v1beta/models/<model>:generateContent, REST shape of the Gemini API."""
+    if not target.endswith(":generateContent"):
+        return JSONResponse({"error": {"code": 404, "message": "unsupported method"}}, status_code=404)
+
+    body = await request.json()
+    prompt = " ".join(
+        part.get("text", "")
+        for content in body.get("contents", [])
+        for part in content.get("parts", [])
+    )
+    config = body.get("generationConfig") or body.get("generation_config") or {}
+    structured = (config.get("responseMimeType") or config.get("response_mime_type")) == "application/json"
+
+    error = fault()
+    if error is not None:
+        return error
+
+    async with STATE["slots"]:
+        await maybe_hang()
+        text = answer_for(prompt, structured)
+        await asyncio.sleep(sample_latency() + len(tokens(text)) / CONFIG["tokens_per_sec"])
+    STATE["served"] += 1
+
+    return {
+        "candidates": [{
+            "content": {"role": "model", "parts": [{"text": text}]},
+            "finishReason": "STOP",
+            "index": 0
+        }],
+        "usageMetadata": {"promptTokenCount": len(prompt.split()), "candidatesTokenCount": len(text.split())}
+    }
+
+@app.get("/simulator/stats")
+async def stats():
+    return {"served": STATE["served"], "failed": STATE["failed"], "config": CONFIG}
+
+@app.on_event("startup")
+async def setup():
+    STATE["slots"] = asyncio.Semaphore(max(1, int(CONFIG["max_concurrency"])))
+    if CONFIG["seed"] is not None:
+        STATE["rng"].seed(CONFIG["seed"])
+
+# ==========================================
+# 🚀 MAIN
+# ==========================================
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local Ollama / Gemini simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--models", default=",".join(CONFIG["models"]))
+    for key, value in CONFIG.items():
+        if key not in ("models", "seed"):
+            parser.add_argument("--" + key.replace("_", "-"), type=type(value), default=value)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    CONFIG.update({k: v for k, v in vars(args).items() if k in CONFIG})
+    CONFIG["models"] = [m.strip() for m in args.models.split(",") if m.strip()]
+
+    print(f"🧪 LLM simulator on http://{args.host}:{args.port} ({CONFIG})")
+    uvicorn.run(app, host=args.host, port=args.port)
@@ -0,0 +1,268 @@
+import os
+import time
+import queue
+import datetime
+import threading
+from pymongo import UpdateOne
+from db import get_db
+import work_queue
+from work_queue import claim, fail, release, leased
+import metrics
+from pymongo.errors import PyMongoError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+
+SENTINEL_INTERVAL = int(os.getenv("STREAM_SENTINEL_INTERVAL", "300"))  # seconds between scrapes
+POLL_INTERVAL = float(os.getenv("STREAM_POLL_INTERVAL", "5"))          # fallback when change streams are unavailable
+
+# Streaming admission: no full-day ranking, so topics are approved by threshold + daily cap
+STREAM_MIN_SCORE = int(os.getenv("STREAM_MIN_SCORE", "25"))
+STREAM_DAILY_LIMIT = int(os.getenv("STREAM_DAILY_LIMIT", "20"))
+
+# ==========================================
+# 🔁 STAGE HANDLERS (one document at a time)
+# ==========================================
+
+def score_raw_topic(db, doc):
+    """raw_topics -> top_topics, for a single freshly collected topic."""
+    import processor
+
+    today_str = datetime.date.today().isoformat()
+    title = doc.get('title', 'No Title')
+
+    if doc.get('collected_at') != today_str or processor.is_blocked(title):
+        return
+
+    score_data = processor.calculate_final_score(doc)
+    if score_data['total'] < STREAM_MIN_SCORE:
+        return
+
+    existing = db.top_topics.find_one({"title": title, "date": today_str}, {"_id": 1})
+    if existing is None and db.top_topics.count_documents({"date": today_str}) >= STREAM_DAILY_LIMIT:
+        return
+
+    topic = processor.build_approved_topic(doc, score_data, today_str)
+    # Status only on insert: a re-scored topic must not be sent back to Step 3
+    insert_only = {k: topic.pop(k) for k in ("status", "created_at")}
+    db.top_topics.bulk_write([UpdateOne(
+        {"title": title, "date": today_str},
+        {"$set": topic, "$setOnInsert": insert_only},
+        upsert=True
+    )], ordered=False)
+    print(f"   🏆 [Stream] Approved ({score_data['total']} pts): {title[:50]}")
+
+def generate_topic(db, doc):
+    import generator
+    # Claim first: other stream/batch workers may be looking at the same topic
+    topic = claim(db.top_topics, dict(generator.PENDING_TOPICS, _id=doc["_id"]))
+    if topic is None:
+        return
+    generator.get_available_model()
+    with leased(db.top_topics, [topic["_id"]]):
+        try:
+            return generator.generate_topic(db, topic)
+        except Exception:
+            fail(db.top_topics, topic["_id"])
+            raise
+
+def enhance_tweet(db, doc):
+    import enhancer
+    tweet = claim(db.final_tweets, dict(enhancer.PENDING_TWEETS, _id=doc["_id"]))
+    if tweet is None:
+        return
+    if not enhancer.enhanceable(tweet):
+        release(db.final_tweets, tweet["_id"], {"$set": enhancer.ENHANCE_DEAD_LETTER})
+        return
+    with leased(db.final_tweets, [tweet["_id"]]):
+        try:
+            enhancer.enhance_batch(db, [tweet])
+        except Exception:
+            fail(db.final_tweets, tweet["_id"], dead_letter=enhancer.ENHANCE_DEAD_LETTER)
+            raise
+
+# collection, pending filter, handler, worker threads
+STAGES = {
+    "scoring": ("raw_topics", lambda: {"collected_at": datetime.date.today().isoformat()}, score_raw_topic, 1),
+    "generation": ("top_topics", lambda: {"status": "approved_for_ai"}, generate_topic, 2),
+    "enhancement": ("final_tweets", lambda: {"status": "ready_for_posting", "enhanced": {"$ne": True}}, enhance_tweet, 2)
+}
+
+def matches(doc, query):
+    """Tiny matcher for the equality / $ne filters used in STAGES."""
+    for field, expected in query.items():
+        if isinstance(expected, dict) and "$ne" in expected:
+            if doc.get(field) == expected["$ne"]:
+                return False
+        elif doc.get(field) != expected:
+            return False
+    return True
+
+# ==========================================
+# 🌊 STAGE RUNNER
+# ==========================================
+
+class StreamStage:
+    """
+    Feeds new/changed documents of one collection into a local queue
+    (change stream if the server supports it, polling otherwise)
+    and processes them with a few worker threads.
+    """
+    def __init__(self, name, db, collection, pending_query, handler, workers, stop):
+        self.name = name
+        self.db = db
+        self.collection = db[collection]
+        self.pending_query = pending_query
+        self.handler = handler
+        self.workers = workers
+        self.stop = stop
+        self.queue = queue.Queue()
+        self.in_flight = set()
+        self.failed_at = {}
+        self.lock = threading.Lock()
+        # Polling watermark for raw_topics (sentinel stamps updated_at on every upsert)
+        self.since = None
+        self.offered = {}   # _id -> updated_at read by the last poll
+
+    def offer(self, doc):
+        """Queues a document unless it is already queued/running or cooling down after a failure."""
+        with self.lock:
+            doc_id = doc["_id"]
+            if doc_id in self.in_flight:
+                return
+            if time.time() - self.failed_at.get(doc_id, 0) < work_queue.RETRY_COOLDOWN:
+                return
+            self.in_flight.add(doc_id)
+        self.queue.put(doc)
+        metrics.QUEUE_BACKLOG.labels(stage=self.name).set(self.queue.qsize())
+
+    def poll_once(self):
+        import processor
+
+        query = dict(self.pending_query())
+        watermarked = self.name == "scoring"
+        if watermarked and self.since is not None:
+            # Re-read an overlap before the watermark for writes that land late (as processor.py does)
+            query["updated_at"] = {"$gt": self.since - datetime.timedelta(seconds=processor.WATERMARK_OVERLAP)}
+        newest = self.since
+        seen = {}
+        for doc in self.collection.find(query):
+            stamp = doc.get("updated_at")
+            if watermarked and stamp is not None:
+                newest = stamp if newest is None else max(newest, stamp)
+                seen[doc["_id"]] = stamp
+                # Already offered in this version during an earlier poll's overlap
+                if self.offered.get(doc["_id"]) == stamp:
+                    continue
+            self.offer(doc)
+        if watermarked:
+            # The newest updated_at actually read, never the local clock
+            self.since = newest
+            self.offered = seen
+
+    def watch(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        with self.collection.watch(pipeline, full_document="updateLookup") as events:
+            print(f"   📡 [{self.name}] Listening on change stream.")
+            threading.Thread(target=self.retry_loop, name=f"{self.name}-retry", daemon=True).start()
+            while not self.stop.is_set():
+                event = events.try_next()
+                if event is None:
+                    continue
+                doc = event.get("fullDocument")
+                if doc and matches(doc, self.pending_query()):
+                    self.offer(doc)
+
+    def retry_loop(self):
+        """
+        Alongside the change stream: a failed document changes while it is still in flight,
+        so its event is dropped and only a poll finds it again once the cooldown is over.
+        """
+        while not self.stop.wait(work_queue.RETRY_COOLDOWN):
+            try:
+                self.poll_once()
+            except PyMongoError as e:
+                print(f"   ❌ [{self.name}] Retry poll failed: {e}")
+
+    def feed(self):
+        # Catch up on everything already pending, then follow new changes
+        self.poll_once()
+        try:
+            self.watch()
+            return
+        except PyMongoError as e:
+            print(f"   ⚠️ [{self.name}] Change streams unavailable ({e}), polling every {POLL_INTERVAL}s.")
+
+        while not self.stop.is_set():
+            try:
+                self.poll_once()
+            except PyMongoError as e:
+                print(f"   ❌ [{self.name}] Poll failed: {e}")
+            self.stop.wait(POLL_INTERVAL)
+
+    def work(self):
+        while not self.stop.is_set():
+            try:
+                doc = self.queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            metrics.QUEUE_BACKLOG.labels(stage=self.name).set(self.queue.qsize())
+            if doc["_id"] in self.failed_at:
+                metrics.LLM_RETRIES.labels(stage=self.name).inc()
+            start = time.perf_counter()
+            try:
+                ok = self.handler(self.db, doc) is not False
+            except Exception as e:
+                print(f"   ❌ [{self.name}] {e}")
+                ok = False
+            metrics.STAGE_SECONDS.labels(stage=f"stream_{self.name}").observe(time.perf_counter() - start)
+            with self.lock:
+                if not ok:
+                    # Still pending in Mongo, so wait before a poll picks it up again
+                    self.failed_at[doc["_id"]] = time.time()
+                self.in_flight.discard(doc["_id"])
+
+    def start(self):
+        threads = [threading.Thread(target=self.feed, name=f"{self.name}-feed", daemon=True)]
+        threads += [threading.Thread(target=self.work, name=f"{self.name}-worker-{i}", daemon=True) for i in range(self.workers)]
+        for t in threads:
+            t.start()
+        return threads
+
+def run_sentinel_loop(db, stop):
+    """Scrapes on a timer; conditional GETs keep unchanged feeds cheap."""
+    import sentinel
+    while not stop.is_set():
+        try:
+            sentinel.fetch_news_topics(db.raw_topics)
+            sentinel.fetch_x_trends(db.raw_topics)
+        except Exception as e:
+            print(f"   ❌ [sentinel] {e}")
+        stop.wait(SENTINEL_INTERVAL)
+
+def run_stream(db=None, with_sentinel=True):
+    print("--- 🌊 Streaming Pipeline Started (Ctrl+C to stop) ---")
+    if db is None:
+        db = get_db()
+
+    stop = threading.Event()
+    for name, (collection, pending_query, handler, workers) in STAGES.items():
+        StreamStage(name, db, collection, pending_query, handler, workers, stop).start()
+
+    if with_sentinel:
+        threading.Thread(target=run_sentinel_loop, args=(db, stop), name="sentinel", daemon=True).start()
+
+    try:
+        while not stop.is_set():
+            stop.wait(1)
+    except KeyboardInterrupt:
+        print("\n👋 Stopping stream...")
+        stop.set()
+
+if __name__ == "__main__":
+    run_stream()
@@ -0,0 +1,125 @@
+import re
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+TWEETS_PER_TOPIC = 3
+MAX_TWEET_CHARS = 280      # tweet text + " " + hashtags, as posted
+MAX_HASHTAGS = 3
+VARIANT_TYPES = ("Emotional", "Informative", "Call to Action")
+
+HASHTAG = re.compile(r"^#\w+$")
+WHITESPACE = re.compile(r"\s+")
+
+# ==========================================
+# 📐 JSON SCHEMAS (Ollama `format`)
+# ==========================================
+
+VARIANT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "type": {"type": "string", "enum": list(VARIANT_TYPES)},
+        "tweet": {"type": "string", "maxLength": MAX_TWEET_CHARS},
+        "hashtags": {"type": "array", "items": {"type": "string"}, "minItems": 1, "maxItems": MAX_HASHTAGS}
+    },
+    "required": ["type", "tweet", "hashtags"]
+}
+
+VARIANTS_SCHEMA = {
+    "type": "array",
+    "items": VARIANT_SCHEMA,
+    "minItems": TWEETS_PER_TOPIC,
+    "maxItems": TWEETS_PER_TOPIC
+}
+
+# One topic: {"tweet_variants": [...]}, the shape final_tweets stores
+TWEET_SCHEMA = {
+    "type": "object",
+    "properties": {"tweet_variants": VARIANTS_SCHEMA},
+    "required": ["tweet_variants"]
+}
+
+# Several topics in one request: {"drafts": [{"id": 0, "tweet_variants": [...]}]}
+BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "drafts": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, "tweet_variants": VARIANTS_SCHEMA},
+                "required": ["id", "tweet_variants"]
+            }
+        }
+    },
+    "required": ["drafts"]
+}
+
+# ==========================================
+# ✅ LOCAL VALIDATOR
+# ==========================================
+
+def normalize_variant(variant):
+    """Cheap fixes that don't need an LLM: whitespace, missing '#', duplicate tags."""
+    if not isinstance(variant, dict):
+        return variant
+    tags = variant.get("hashtags")
+    if isinstance(tags, str):
+        tags = tags.split()
+    if isinstance(tags, list):
+        seen = []
+        for tag in tags:
+            tag = "#" + str(tag).strip().lstrip("#")
+            if tag != "#" and tag not in seen:
+                seen.append(tag)
+        tags = seen
+    tweet = variant.get("tweet")
+    return dict(
+        variant,
+        tweet=WHITESPACE.sub(" ", tweet).strip() if isinstance(tweet, str) else tweet,
+        hashtags=tags
+    )
+
+def posted_length(variant):
+    return len(variant["tweet"]) + sum(len(tag) + 1 for tag in variant["hashtags"])
+
+def validate(doc):
+    """
+    Checks a {"tweet_variants": [...]} document against the posting rules.
+    Returns (normalized document, [problems]); no problems means it can be saved as is.
+    """
+    if not isinstance(doc, dict) or not isinstance(doc.get("tweet_variants"), list):
+        return doc, ["missing tweet_variants list"]
+
+    variants = [normalize_variant(v) for v in doc["tweet_variants"]]
+    problems = []
+    if len(variants) != TWEETS_PER_TOPIC:
+        problems.append(f"expected {TWEETS_PER_TOPIC} variants, got {len(variants)}")
+
+    seen = set()
+    for n, v in enumerate(variants, 1):
+        if not isinstance(v, dict):
+            problems.append(f"variant {n} is not an object")
+            continue
+        tweet, tags = v.get("tweet"), v.get("hashtags")
+        if not isinstance(tweet, str) or not tweet:
+            problems.append(f"variant {n} has no tweet text")
+            continue
+        if not isinstance(v.get("type"), str) or not v["type"]:
+            problems.append(f"variant {n} has no type")
+        if not isinstance(tags, list) or not tags:
+            problems.append(f"variant {n} has no hashtags")
+            continue
+        if len(tags) > MAX_HASHTAGS:
+            problems.append(f"variant {n} has {len(tags)} hashtags (max {MAX_HASHTAGS})")
+        bad = [t for t in tags if not HASHTAG.match(t)]
+        if bad:
+            problems.append(f"variant {n} has invalid hashtags {bad}")
+        if posted_length(v) > MAX_TWEET_CHARS:
+            problems.append(f"variant {n} is {posted_length(v)} chars with hashtags (max {MAX_TWEET_CHARS})")
+        if tweet.lower() in seen:
+            problems.append(f"variant {n} repeats an earlier tweet")
+        seen.add(tweet.lower())
+
+    return dict(doc, tweet_variants=variants), problems
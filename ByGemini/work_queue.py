@@ -0,0 +1,151 @@
+import os
+import time
+import socket
+import datetime
+import threading
+import contextlib
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# ==========================================
+# ⚙️ CONFIGURATION
+# ==========================================
+
+# A claimed document belongs to one worker until its lease runs out.
+# Heartbeats extend it while the work is still running.
+LEASE_SECONDS = int(os.getenv("WORK_LEASE_SECONDS", "300"))
+HEARTBEAT_INTERVAL = max(1, LEASE_SECONDS // 3)
+RETRY_COOLDOWN = int(os.getenv("WORK_RETRY_COOLDOWN", "300"))   # failed documents wait this long, for every worker
+MAX_ATTEMPTS = int(os.getenv("WORK_MAX_ATTEMPTS", "5"))          # claims per document before it is given up on
+WORKER_ID = os.getenv("WORKER_ID") or f"{socket.gethostname()}:{os.getpid()}"
+
+LEASE_FIELDS = {"lease_owner": "", "lease_until": ""}
+
+# What fail() sets once a document has used up its attempts
+DEAD_LETTER = {"status": "dead_letter"}
+
+# ==========================================
+# 🔒 CLAIM / RELEASE
+# ==========================================
+
+# Lease times are UTC, so workers in other timezones agree on when a lease runs out.
+# (Plain update operators rather than $$NOW pipelines, which mongomock can't evaluate.)
+def utcnow():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+def lease_deadline(seconds=LEASE_SECONDS):
+    return utcnow() + datetime.timedelta(seconds=seconds)
+
+def claim(collection, query, sort=None):
+    """
+    Atomically takes one matching document nobody holds (or whose lease expired)
+    and that has attempts left. Returns the document, or None when there is nothing left to claim.
+    """
+    claimable = {
+        "$or": [{"lease_until": None}, {"lease_until": {"$lte": utcnow()}}],
+        "attempts": {"$not": {"$gte": MAX_ATTEMPTS}}
+    }
+    return collection.find_one_and_update(
+        {"$and": [query, claimable]},
+        {"$set": {"lease_owner": WORKER_ID, "lease_until": lease_deadline()}, "$inc": {"attempts": 1}},
+        sort=sort or [("_id", 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def claim_many(collection, query, limit, sort=None):
+    docs = []
+    while len(docs) < limit:
+        doc = claim(collection, query, sort)
+        if doc is None:
+            break
+        docs.append(doc)
+    return docs
+
+def owned_by_me(doc_id):
+    # Unleased counts too, so callers that never claimed (e.g. a manual run) still finish documents
+    return {"_id": doc_id, "$or": [{"lease_owner": WORKER_ID}, {"lease_owner": None}]}
+
+def release(collection, doc_id, update=None):
+    """
+    Applies update and drops the lease, unless another worker has taken the document over.
+    Returns True if this worker still held it.
+    """
+    update = dict(update or {})
+    update["$unset"] = dict(update.get("$unset", {}), **LEASE_FIELDS)
+    forget(collection, doc_id)
+    return collection.update_one(owned_by_me(doc_id), update).matched_count == 1
+
+def fail(collection, doc_id, cooldown=RETRY_COOLDOWN, dead_letter=DEAD_LETTER):
+    """
+    Gives a failed document back, but nobody may claim it again before the cooldown.
+    After MAX_ATTEMPTS claims the dead_letter fields are set instead, so it leaves the queue for good.
+    """
+    forget(collection, doc_id)
+    now = utcnow()
+    exhausted = collection.update_one(
+        dict(owned_by_me(doc_id), attempts={"$gte": MAX_ATTEMPTS}),
+        {"$set": dict(dead_letter, failed_at=now), "$unset": LEASE_FIELDS}
+    )
+    if exhausted.matched_count:
+        return
+    collection.update_one(
+        owned_by_me(doc_id),
+        {"$set": {"lease_until": lease_deadline(cooldown), "failed_at": now}, "$unset": {"lease_owner": ""}}
+    )
+
+# ==========================================
+# 💓 HEARTBEATS
+# ==========================================
+
+class LeaseKeeper:
+    """Renews every lease this process holds on one collection, in one update_many per heartbeat."""
+    def __init__(self, collection):
+        self.collection = collection
+        self.ids = set()
+        self.lock = threading.Lock()
+        threading.Thread(target=self.beat, name=f"lease-{collection.name}", daemon=True).start()
+
+    def beat(self):
+        while True:
+            time.sleep(HEARTBEAT_INTERVAL)
+            with self.lock:
+                ids = list(self.ids)
+            if not ids:
+                continue
+            try:
+                result = self.collection.update_many(
+                    {"_id": {"$in": ids}, "lease_owner": WORKER_ID},
+                    {"$set": {"lease_until": lease_deadline()}}
+                )
+                if result.matched_count < len(ids):
+                    print(f"   ⚠️ {len(ids) - result.matched_count} lease(s) on {self.collection.name} were taken over.")
+            except PyMongoError as e:
+                print(f"   ⚠️ Lease heartbeat on {self.collection.name} failed: {e}")
+
+_KEEPERS = {}
+_KEEPERS_LOCK = threading.Lock()
+
+def forget(collection, doc_id):
+    """Stops heartbeats for a document that is being handed back."""
+    keeper = _KEEPERS.get(collection.full_name)
+    if keeper is not None:
+        with keeper.lock:
+            keeper.ids.discard(doc_id)
+
+@contextlib.contextmanager
+def leased(collection, ids):
+    """Keeps the leases on ids alive for the duration of the block."""
+    with _KEEPERS_LOCK:
+        keeper = _KEEPERS.get(collection.full_name)
+        if keeper is None:
+            keeper = _KEEPERS[collection.full_name] = LeaseKeeper(collection)
+    with keeper.lock:
+        keeper.ids.update(ids)
+    try:
+        yield
+    finally:
+        with keeper.lock:
+            keeper.ids.difference_update(ids)